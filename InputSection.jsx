@@ -13,6 +13,7 @@ function InputSection({ onGenerate, isLoggedIn = false }) {
   const [hoveredButton, setHoveredButton] = useState(null);
   const [isDragging, setIsDragging] = useState(false);
   const [isProcessingFile, setIsProcessingFile] = useState(false);
+  const [session, setSession] = useState(null); // { docId, version, text } of last summarized text (docId null before any edit)
   const navigate = useNavigate();
 
   const WORD_LIMIT = isLoggedIn ? 1000 : 500;
@@ -90,20 +91,58 @@ function InputSection({ onGenerate, isLoggedIn = false }) {
     }
   };
 
+  // Single replacement covering everything between the common prefix and suffix
+  const diffText = (oldText, newText) => {
+    let start = 0;
+    while (start < oldText.length && start < newText.length && oldText[start] === newText[start]) start++;
+    let oldEnd = oldText.length;
+    let newEnd = newText.length;
+    while (oldEnd > start && newEnd > start && oldText[oldEnd - 1] === newText[newEnd - 1]) {
+      oldEnd--;
+      newEnd--;
+    }
+    return [{ start, end: oldEnd, text: newText.slice(start, newEnd) }];
+  };
+
+  const postJson = (path, body) =>
+    fetch(`${API_URL}${path}`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(body),
+    });
+  const postIncremental = (body) => postJson("/summarize/incremental", body);
+
   const handleGenerate = async () => {
     if (!inputText.trim()) return;
 
     try {
-      const response = await fetch(`${API_URL}/summarize`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ text: inputText }),
-      });
+      // A new text goes to /summarize, which shares work with identical
+      // requests and reuses stored summaries. Once it is edited, the
+      // incremental endpoint takes over: the full text opens a session, and
+      // after that only the edit is sent and unchanged sentences are reused.
+      const edited = session && session.text !== inputText;
+      let response;
+      if (session && session.docId)
+        response = await postIncremental({
+          doc_id: session.docId,
+          version: session.version,
+          edits: diffText(session.text, inputText),
+        });
+      else if (edited) response = await postIncremental({ text: inputText });
+      else response = await postJson("/summarize", { text: inputText });
+
+      // Session expired or out of sync: resend the whole document
+      if (session && session.docId && (response.status === 404 || response.status === 409))
+        response = await postIncremental({ doc_id: session.docId, text: inputText });
+
+      // Model not loaded: the plain endpoint still has a lead-sentence fallback
+      if (response.status === 503) response = await postJson("/summarize", { text: inputText });
 
       if (!response.ok)
         throw new Error(`Server responded with status ${response.status}`);
 
       const data = await response.json();
+      setSession({ docId: data.doc_id || null, version: data.version, text: inputText });
       if (data.summary) {
         onGenerate(data.summary);
         setFileError("");
@@ -1,5 +1,6 @@
 import os
 import pickle
+import hashlib
 import traceback
 import numpy as np
 import math
@@ -22,6 +23,8 @@ POSSIBLE_MODEL_PATHS = [
     "improved_rnn_model.pkl",
     "fast_extractive_model.pkl"
 ]
+# distillation.py saves the student scorer under this name
+FAST_MODEL_FILE = "fast_extractive_model.pkl"
 
 _model = None
 _preprocessor = None
@@ -44,6 +47,11 @@ def calculate_dynamic_summary_length(text):
     sentences = split_into_sentences(text)
     sentence_count = len(sentences)
 
+    return summary_length_from_counts(word_count, sentence_count)
+
+
+def summary_length_from_counts(word_count, sentence_count):
+    """calculate_dynamic_summary_length() for callers that only have running counts"""
     if sentence_count <= 5:
         if sentence_count <= 2:
             return 1 
@@ -83,6 +91,58 @@ def find_model_file():
             return path
     return None
 
+def find_fast_model_file():
+    """First existing fast_extractive_model.pkl among POSSIBLE_MODEL_PATHS"""
+    for path in POSSIBLE_MODEL_PATHS:
+        if os.path.basename(path.replace('\\', '/')) == FAST_MODEL_FILE and os.path.exists(path):
+            return path
+    return None
+
+def model_file_version(model_path):
+    """Short content hash of a model file; changes whenever the model is retrained"""
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def load_model_file(model_path):
+    """Load (model, preprocessor) from a pickle without touching the cached globals"""
+    with open(model_path, "rb") as f:
+        data = pickle.load(f)
+
+    if not isinstance(data, dict):
+        return None, None
+
+    if 'model' in data and 'preprocessor' in data:
+        return data['model'], data['preprocessor']
+    if 'config' in data and 'model_params' in data and 'preprocessor' in data:
+        config = data['config']
+        model_params = data['model_params']
+        preprocessor = data['preprocessor']
+        model = ImprovedExtractiveRNNSummarizer(**config)
+        try:
+            if 'word_encoder' in model_params:
+                we = model_params['word_encoder']
+                model.word_encoder.embedding = we.get('embedding', model.word_encoder.embedding)
+                model.word_encoder.W_ih = we.get('W_ih', model.word_encoder.W_ih)
+                model.word_encoder.W_hh = we.get('W_hh', model.word_encoder.W_hh)
+                model.word_encoder.b_h = we.get('b_h', model.word_encoder.b_h)
+            if 'sentence_encoder' in model_params:
+                se = model_params['sentence_encoder']
+                model.sentence_encoder.W_ih_sent = se.get('W_ih_sent', model.sentence_encoder.W_ih_sent)
+                model.sentence_encoder.W_hh_sent = se.get('W_hh_sent', model.sentence_encoder.W_hh_sent)
+                model.sentence_encoder.b_h_sent = se.get('b_h_sent', model.sentence_encoder.b_h_sent)
+            if 'classifier' in model_params:
+                cl = model_params['classifier']
+                model.classifier.W_class = cl.get('W_class', model.classifier.W_class)
+                model.classifier.b_class = cl.get('b_class', model.classifier.b_class)
+        except Exception as e:
+            print(f"Error loading parameters: {e}")
+        return model, preprocessor
+    return None, data.get('preprocessor')
+
 def load_model(force_dummy=False):
     global _model, _preprocessor, _model_loaded
     if _model_loaded and _model and _preprocessor:
@@ -99,37 +159,8 @@ def load_model(force_dummy=False):
             print("No model file found, using dummy fallback")
             return load_model(force_dummy=True)
 
-        with open(model_path, "rb") as f:
-            data = pickle.load(f)
-
-        if isinstance(data, dict):
-            if 'model' in data and 'preprocessor' in data:
-                _model = data['model']
-                _preprocessor = data['preprocessor']
-            elif 'config' in data and 'model_params' in data and 'preprocessor' in data:
-                config = data['config']
-                model_params = data['model_params']
-                _preprocessor = data['preprocessor']
-                _model = ImprovedExtractiveRNNSummarizer(**config)
-                try:
-                    if 'word_encoder' in model_params:
-                        we = model_params['word_encoder']
-                        _model.word_encoder.embedding = we.get('embedding', _model.word_encoder.embedding)
-                        _model.word_encoder.W_ih = we.get('W_ih', _model.word_encoder.W_ih)
-                        _model.word_encoder.W_hh = we.get('W_hh', _model.word_encoder.W_hh)
-                        _model.word_encoder.b_h = we.get('b_h', _model.word_encoder.b_h)
-                    if 'sentence_encoder' in model_params:
-                        se = model_params['sentence_encoder']
-                        _model.sentence_encoder.W_ih_sent = se.get('W_ih_sent', _model.sentence_encoder.W_ih_sent)
-                        _model.sentence_encoder.W_hh_sent = se.get('W_hh_sent', _model.sentence_encoder.W_hh_sent)
-                        _model.sentence_encoder.b_h_sent = se.get('b_h_sent', _model.sentence_encoder.b_h_sent)
-                    if 'classifier' in model_params:
-                        cl = model_params['classifier']
-                        _model.classifier.W_class = cl.get('W_class', _model.classifier.W_class)
-                        _model.classifier.b_class = cl.get('b_class', _model.classifier.b_class)
-                except Exception as e:
-                    print(f"Error loading parameters: {e}")
-        else:
+        _model, _preprocessor = load_model_file(model_path)
+        if _model is None:
             print("Pickle file is not a dictionary, using dummy fallback")
             return load_model(force_dummy=True)
 
@@ -151,10 +182,14 @@ def generate_summary(model, article, preprocessor, max_sentences=3, threshold=0.
     print("=== DEBUGGING SUMMARY GENERATION ===")
     
     sentences_text = split_into_sentences(article)
-    total_sentences = len(sentences_text)
-    print(f"1. Split into {total_sentences} sentences")
+    print(f"1. Split into {len(sentences_text)} sentences")
     
-    if total_sentences == 0:
+    return summarize_sentences(model, sentences_text, preprocessor, max_sentences)
+
+
+def summarize_sentences(model, sentences_text, preprocessor, max_sentences=3):
+    """generate_summary() for text that has already been split into sentences"""
+    if len(sentences_text) == 0:
         return "No sentences found."
     
     # Convert to indices
@@ -183,6 +218,11 @@ def generate_summary(model, article, preprocessor, max_sentences=3, threshold=0.
         print(f"3. Model forward pass failed: {e}")
         probabilities = np.ones(len(valid_sentences)) * 0.5
     
+    return summary_from_probabilities(probabilities, valid_sentences, max_sentences)
+
+
+def summary_from_probabilities(probabilities, valid_sentences, max_sentences=3):
+    """Position weighting and diversity-aware selection over model probabilities"""
     probabilities = np.array(probabilities, dtype=float)
     
     # FIXED: Apply position weights more carefully
@@ -247,6 +287,49 @@ def generate_summary(model, article, preprocessor, max_sentences=3, threshold=0.
     return summary
 
 
+def stream_summary(model, article, preprocessor, max_sentences=3, checkpoint_every=5):
+    """Yield ('score', {...}) per sentence as it is scored, ('summary', {...}) at checkpoints.
+
+    A provisional summary over the sentences scored so far is emitted every
+    checkpoint_every sentences; the last event is always the final summary.
+    If the model fails part way, the final summary uses the same uniform-score
+    fallback as summarize_sentences() and is marked 'fallback'.
+    """
+    sentences_text = split_into_sentences(article)
+    valid_pairs = [(s, idx) for s in sentences_text for idx in [preprocessor.text_to_indices(s)] if len(idx) > 2]
+    if not valid_pairs:
+        fallback = sentences_text[0] if sentences_text else "No valid sentences."
+        yield 'summary', {'summary': fallback, 'final': True, 'scored': 0, 'total': 0}
+        return
+    
+    valid_sentences, valid_indices = zip(*valid_pairs)
+    total = len(valid_sentences)
+    probabilities = []
+    fallback = False
+    try:
+        if hasattr(model, 'iter_scores'):
+            scores = model.iter_scores(list(valid_indices))
+        else:
+            # Models without a left-to-right recurrence are scored in one pass
+            forward_probabilities, _ = model.forward(list(valid_indices), training=False)
+            scores = enumerate(np.asarray(forward_probabilities, dtype=float).tolist())
+        
+        for i, probability in scores:
+            probabilities.append(probability)
+            yield 'score', {'index': i, 'sentence': valid_sentences[i], 'probability': probability}
+            scored = len(probabilities)
+            if checkpoint_every and scored % checkpoint_every == 0 and scored < total:
+                summary = summary_from_probabilities(probabilities, valid_sentences[:scored], max_sentences)
+                yield 'summary', {'summary': summary, 'final': False, 'scored': scored, 'total': total}
+    except Exception as e:
+        print(f"3. Model forward pass failed: {e}")
+        probabilities = np.ones(total) * 0.5
+        fallback = True
+    
+    summary = summary_from_probabilities(probabilities, valid_sentences, max_sentences)
+    yield 'summary', {'summary': summary, 'final': True, 'scored': total, 'total': total, 'fallback': fallback}
+
+
 def improved_sentence_selection(probabilities, sentences, max_sentences=3, diversity_weight=0.4):
     """Select sentences with diversity consideration to avoid sequential bias"""
     import numpy as np
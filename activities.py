@@ -0,0 +1,257 @@
+# activities.py
+import json
+import base64
+import hashlib
+import traceback
+from datetime import datetime
+from flask import Blueprint, request, jsonify, make_response
+from flask_jwt_extended import jwt_required
+from sqlalchemy import tuple_
+from models import db, Activity
+from auth import current_user_id
+
+# Activity (to-do) API.
+#
+# Lists are ordered by (date, id) and paginated with an opaque keyset cursor
+# holding the last (date, id) returned, so every page is one range scan on
+# ix_activities_user_id_date however deep the client pages. Bulk writes load
+# or change all affected rows with one statement and commit once. List
+# responses carry an ETag derived from the rows on the page; a matching
+# If-None-Match gets 304 without a body. The page query still runs, so this
+# saves the transfer and the client's re-render, not database work.
+
+activities = Blueprint("activities", __name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BULK_ITEMS = 1000
+
+
+class ActivityError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def activity_to_dict(activity):
+    return {
+        "id": activity.id,
+        "title": activity.title,
+        "date": activity.date.isoformat(),
+        "completed": bool(activity.completed),
+        "created_at": activity.created_at.isoformat() if activity.created_at else None,
+    }
+
+
+def parse_datetime(value, field):
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        raise ActivityError(f"Invalid {field}: expected an ISO 8601 date")
+
+
+def encode_cursor(activity):
+    raw = json.dumps([activity.date.isoformat(), activity.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, activity_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(date), int(activity_id)
+    except Exception:
+        raise ActivityError("Invalid cursor")
+
+
+def _items(data):
+    items = data.get("items") if isinstance(data, dict) and "items" in data else [data]
+    if not isinstance(items, list) or not items:
+        raise ActivityError("No activities provided")
+    if len(items) > MAX_BULK_ITEMS:
+        raise ActivityError(f"At most {MAX_BULK_ITEMS} activities per request")
+    return items
+
+
+def _ids(data):
+    ids = data.get("ids") if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not ids:
+        raise ActivityError("No activity ids provided")
+    if len(ids) > MAX_BULK_ITEMS:
+        raise ActivityError(f"At most {MAX_BULK_ITEMS} ids per request")
+    try:
+        return sorted({int(i) for i in ids})
+    except (TypeError, ValueError):
+        raise ActivityError("Activity ids must be integers")
+
+
+def _load_owned(user_id, ids):
+    """All requested activities in one query; every id must belong to the user"""
+    rows = Activity.query.filter(Activity.user_id == user_id, Activity.id.in_(ids)).all()
+    if len(rows) != len(ids):
+        missing = sorted(set(ids) - {row.id for row in rows})
+        raise ActivityError(f"Activities not found: {missing}", 404)
+    return rows
+
+
+def _apply_fields(activity, item):
+    if "title" in item:
+        title = str(item["title"] or "").strip()
+        if not title or len(title) > 200:
+            raise ActivityError("Title must be 1-200 characters")
+        activity.title = title
+    if "date" in item:
+        activity.date = parse_datetime(item["date"], "date")
+    if "completed" in item:
+        activity.completed = bool(item["completed"])
+
+
+def create_activities(user_id, items):
+    created = []
+    for item in items:
+        if not isinstance(item, dict) or "title" not in item or "date" not in item:
+            raise ActivityError("Each activity needs a title and a date")
+        activity = Activity(user_id=user_id, completed=False)
+        _apply_fields(activity, item)
+        created.append(activity)
+    db.session.add_all(created)
+    return created
+
+
+def update_activities(user_id, items):
+    by_id = {}
+    for item in items:
+        if not isinstance(item, dict) or "id" not in item:
+            raise ActivityError("Each update needs an id")
+        try:
+            activity_id = int(item["id"])
+        except (TypeError, ValueError):
+            raise ActivityError("Activity ids must be integers")
+        by_id[activity_id] = item
+    rows = _load_owned(user_id, sorted(by_id))
+    for activity in rows:
+        _apply_fields(activity, by_id[activity.id])
+    return rows
+
+
+def set_completed(user_id, ids, completed):
+    rows = _load_owned(user_id, ids)
+    for activity in rows:
+        activity.completed = completed
+    return rows
+
+
+def delete_activities(user_id, ids):
+    rows = _load_owned(user_id, ids)
+    for activity in rows:
+        db.session.delete(activity)
+    return rows
+
+
+def list_page(user_id, limit, cursor=None, start=None, end=None, completed=None):
+    query = Activity.query.filter(Activity.user_id == user_id)
+    if start is not None:
+        query = query.filter(Activity.date >= start)
+    if end is not None:
+        query = query.filter(Activity.date < end)
+    if completed is not None:
+        query = query.filter(Activity.completed == completed)
+    if cursor is not None:
+        query = query.filter(tuple_(Activity.date, Activity.id) > tuple_(*cursor))
+    # One extra row tells whether there is a next page
+    rows = query.order_by(Activity.date, Activity.id).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def page_etag(rows, has_more):
+    digest = hashlib.sha1()
+    for a in rows:
+        digest.update(f"{a.id}|{a.date.isoformat()}|{int(bool(a.completed))}|{a.title}\n".encode('utf-8'))
+    digest.update(b"more" if has_more else b"end")
+    return digest.hexdigest()
+
+
+def _run_write(fn, status=200):
+    """Run a bulk write for the current user as one transaction"""
+    try:
+        user_id = current_user_id()
+        data = request.get_json(silent=True) or {}
+        rows, deleted = fn(user_id, data)
+        db.session.commit()
+        if deleted:
+            return jsonify({"deleted": deleted}), status
+        return jsonify({"items": [activity_to_dict(a) for a in rows]}), status
+    except ActivityError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        db.session.rollback()
+        print(f"Activity write error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": "Failed to save activities"}), 500
+
+
+@activities.route('', methods=['GET'])
+@jwt_required()
+def list_activities():
+    """Keyset-paginated activities: ?limit=&cursor=&from=&to=&completed="""
+    try:
+        user_id = current_user_id()
+        limit = min(max(request.args.get("limit", DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        cursor = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        start = parse_datetime(request.args["from"], "from") if request.args.get("from") else None
+        end = parse_datetime(request.args["to"], "to") if request.args.get("to") else None
+        completed = request.args.get("completed")
+        completed = None if completed is None else completed.lower() in ("1", "true", "yes")
+
+        rows, has_more = list_page(user_id, limit, cursor, start, end, completed)
+        etag = page_etag(rows, has_more)
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        response = jsonify({
+            "items": [activity_to_dict(a) for a in rows],
+            "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+        })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except ActivityError as e:
+        return jsonify({"error": str(e)}), e.status
+
+@activities.route('', methods=['POST'])
+@jwt_required()
+def create():
+    """Create one activity, or many with {"items": [...]}"""
+    return _run_write(lambda user_id, data: (create_activities(user_id, _items(data)), None), 201)
+
+@activities.route('', methods=['PATCH'])
+@jwt_required()
+def bulk_update():
+    """Update many activities: {"items": [{"id", "title"?, "date"?, "completed"?}]}"""
+    return _run_write(lambda user_id, data: (update_activities(user_id, _items(data)), None))
+
+@activities.route('/complete', methods=['POST'])
+@jwt_required()
+def bulk_complete():
+    """Mark activities done (or not): {"ids": [...], "completed": true}"""
+    return _run_write(lambda user_id, data: (set_completed(user_id, _ids(data), bool(data.get("completed", True))),
+                                             None))
+
+@activities.route('', methods=['DELETE'])
+@jwt_required()
+def bulk_delete():
+    """Delete activities: {"ids": [...]}"""
+    return _run_write(lambda user_id, data: ([], [a.id for a in delete_activities(user_id, _ids(data))]))
+
+@activities.route('/<int:activity_id>', methods=['PATCH'])
+@jwt_required()
+def update_one(activity_id):
+    return _run_write(lambda user_id, data: (update_activities(user_id, [dict(data, id=activity_id)]), None))
+
+@activities.route('/<int:activity_id>', methods=['DELETE'])
+@jwt_required()
+def delete_one(activity_id):
+    return _run_write(lambda user_id, data: ([], [a.id for a in delete_activities(user_id, [activity_id])]))
@@ -0,0 +1,258 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from functools import wraps
+from flask import request, jsonify, make_response
+
+# Admission control for the summarization endpoints.
+#
+# Every request is given a cost, roughly the number of tokens the model will
+# actually run over (sentences scored x tokens per sentence, with the same
+# caps split_into_sentences applies). Two limits are checked before the view
+# runs:
+#   - a global in-flight budget: the summed cost of requests currently being
+#     served may not exceed capacity (one request alone is always admitted,
+#     however large)
+#   - a token bucket per identity (JWT identity, else client IP) refilled at
+#     rate cost units per second up to burst
+# A request over either limit is rejected immediately with 429 and a
+# Retry-After header instead of queueing behind the others.
+#
+# State is in-process by default. With a SQLite path, it is kept in that
+# database so every worker process shares the same budget and buckets.
+
+MAX_SCORED_SENTENCES = 10
+MAX_SENTENCE_TOKENS = 30
+_TERMINATORS_RE = re.compile(r'[.!?]+\s')
+
+
+def estimate_cost(text):
+    """Estimated sentences x tokens the model will process for text"""
+    if not text:
+        return 1
+    words = len(text.split())
+    sentences = max(1, len(_TERMINATORS_RE.findall(text)) + 1)
+    per_sentence = min(MAX_SENTENCE_TOKENS, max(1, words // sentences))
+    return min(sentences, MAX_SCORED_SENTENCES) * per_sentence
+
+
+def _refill(tokens, updated_at, now, rate, burst):
+    return min(burst, tokens + (now - updated_at) * rate)
+
+
+class MemoryAdmissionState:
+    def __init__(self, max_identities=100000):
+        self.max_identities = max_identities
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._next_token = 0
+        self._buckets = {}
+
+    def acquire(self, cost, capacity):
+        with self._lock:
+            used = sum(self._in_flight.values())
+            if used and used + cost > capacity:
+                return None
+            self._next_token += 1
+            self._in_flight[self._next_token] = cost
+            return self._next_token
+
+    def release(self, token):
+        with self._lock:
+            self._in_flight.pop(token, None)
+
+    def in_flight(self):
+        with self._lock:
+            return sum(self._in_flight.values())
+
+    def consume(self, identity, amount, rate, burst):
+        """Take amount from identity's bucket; returns 0 or seconds until it would succeed"""
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(identity, (burst, now))
+            tokens = _refill(tokens, updated_at, now, rate, burst)
+            retry_after = 0.0
+            if tokens >= amount:
+                tokens -= amount
+            else:
+                retry_after = (amount - tokens) / rate
+            self._buckets[identity] = (tokens, now)
+            if len(self._buckets) > self.max_identities:
+                self._prune(now, rate, burst)
+            return retry_after
+
+    def _prune(self, now, rate, burst):
+        # Buckets that have refilled completely carry no information
+        for identity, (tokens, updated_at) in list(self._buckets.items()):
+            if _refill(tokens, updated_at, now, rate, burst) >= burst:
+                del self._buckets[identity]
+
+
+class SQLiteAdmissionState:
+    """Same interface, shared through a SQLite file by every process that opens it"""
+
+    def __init__(self, path, lease_seconds=300):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS admission_inflight "
+                     "(id INTEGER PRIMARY KEY AUTOINCREMENT, cost INTEGER NOT NULL, expires_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS admission_buckets "
+                     "(identity TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        return conn
+
+    def acquire(self, cost, capacity):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Leases expire so a crashed worker cannot hold budget forever
+            conn.execute("DELETE FROM admission_inflight WHERE expires_at < ?", (now,))
+            used = conn.execute("SELECT COALESCE(SUM(cost), 0) FROM admission_inflight").fetchone()[0]
+            if used and used + cost > capacity:
+                token = None
+            else:
+                token = conn.execute("INSERT INTO admission_inflight (cost, expires_at) VALUES (?, ?)",
+                                     (cost, now + self.lease_seconds)).lastrowid
+            conn.execute("COMMIT")
+            return token
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release(self, token):
+        self._conn().execute("DELETE FROM admission_inflight WHERE id = ?", (token,))
+
+    def in_flight(self):
+        return self._conn().execute("SELECT COALESCE(SUM(cost), 0) FROM admission_inflight "
+                                    "WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+
+    def consume(self, identity, amount, rate, burst):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM admission_buckets WHERE identity = ?",
+                               (identity,)).fetchone()
+            tokens = _refill(row[0], row[1], now, rate, burst) if row else burst
+            retry_after = 0.0
+            if tokens >= amount:
+                tokens -= amount
+            else:
+                retry_after = (amount - tokens) / rate
+            conn.execute("INSERT INTO admission_buckets (identity, tokens, updated_at) VALUES (?, ?, ?) "
+                         "ON CONFLICT(identity) DO UPDATE SET tokens = excluded.tokens, "
+                         "updated_at = excluded.updated_at", (identity, tokens, now))
+            conn.execute("COMMIT")
+            return retry_after
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def request_identity():
+    """'user:<id>' for a valid JWT, otherwise 'ip:<address>'"""
+    try:
+        from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+        if verify_jwt_in_request(optional=True):
+            identity = get_jwt_identity()
+            if isinstance(identity, dict):
+                identity = identity.get('id', identity.get('email'))
+            if identity is not None:
+                return f"user:{identity}"
+    except Exception:
+        pass
+    return f"ip:{request.remote_addr}"
+
+
+def json_text_cost():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return 1  # the view rejects it
+    text = data.get('text')
+    if not isinstance(text, str):
+        # Incremental edits: only the inserted text is new work
+        edits = data.get('edits') if isinstance(data.get('edits'), list) else []
+        text = ' '.join(edit['text'] for edit in edits
+                        if isinstance(edit, dict) and isinstance(edit.get('text'), str))
+    return estimate_cost(text)
+
+
+def upload_cost():
+    # The body has not been read yet; assume about six bytes per word
+    words = (request.content_length or 0) // 6
+    return min(MAX_SCORED_SENTENCES * MAX_SENTENCE_TOKENS, max(1, words))
+
+
+class AdmissionController:
+    def __init__(self, capacity=2000, rate=50.0, burst=600, state=None):
+        self.capacity = capacity
+        self.rate = rate
+        self.burst = burst
+        self.state = state or MemoryAdmissionState()
+        self._lock = threading.Lock()
+        self.stats = {'admitted': 0, 'rejected_capacity': 0, 'rejected_rate': 0}
+
+    @classmethod
+    def from_env(cls):
+        path = os.getenv('ADMISSION_DB')
+        return cls(capacity=int(os.getenv('ADMISSION_CAPACITY', 2000)),
+                   rate=float(os.getenv('RATE_LIMIT_RATE', 50)),
+                   burst=float(os.getenv('RATE_LIMIT_BURST', 600)),
+                   state=SQLiteAdmissionState(path) if path else None)
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _reject(self, key, message, retry_after):
+        self._count(key)
+        response = jsonify({'error': message, 'status': 'rejected'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+        return response
+
+    def limit(self, cost_fn=json_text_cost):
+        """Decorator for views; the in-flight cost is held until the response is closed"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method == 'OPTIONS':
+                    return view(*args, **kwargs)
+                cost = min(max(1, cost_fn()), self.capacity)
+                token = self.state.acquire(cost, self.capacity)
+                if token is None:
+                    return self._reject('rejected_capacity', 'Server busy, try again shortly', 1)
+                retry_after = self.state.consume(request_identity(), min(cost, self.burst), self.rate, self.burst)
+                if retry_after:
+                    self.state.release(token)
+                    return self._reject('rejected_rate', 'Rate limit exceeded', retry_after)
+                self._count('admitted')
+                try:
+                    response = make_response(view(*args, **kwargs))
+                except Exception:
+                    self.state.release(token)
+                    raise
+                if response.is_streamed:
+                    # Streamed bodies are still being computed after the view returns
+                    response.call_on_close(lambda: self.state.release(token))
+                else:
+                    self.state.release(token)
+                return response
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['in_flight_cost'] = self.state.in_flight()
+        stats['capacity'] = self.capacity
+        return stats
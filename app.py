@@ -1,7 +1,10 @@
 import sys
 import os
+import json
+import atexit
 import traceback
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
@@ -23,7 +26,8 @@ from model_classes import (
     ImprovedBinaryClassifier,
     TextPreprocessor
 )
-from LoadSummarizer import load_model, generate_summary
+from LoadSummarizer import (load_model, generate_summary, stream_summary, summarize_sentences,
+                            summary_length_from_counts, find_fast_model_file)
 
 try:
     from LoadSummarizer import calculate_dynamic_summary_length
@@ -48,21 +52,67 @@ CORS(app, origins=["http://localhost:5173", "http://localhost:5174"], supports_c
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///mydb.sqlite3')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwtsecret')
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 10 * 1024 * 1024))
+
+# Password hashing runs on its own process pool (see password_hashing.py).
+# Created before any threads are started; its workers start right away.
+password_hasher = None
+try:
+    from password_hashing import PasswordHasher
+    password_hasher = PasswordHasher.from_env()
+    app.config['BCRYPT_LOG_ROUNDS'] = password_hasher.rounds
+except Exception as e:
+    print(f"Password hashing pool unavailable, hashing inline: {e}")
 
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 
 # Database & Auth Setup
 try:
+    # Pool size, pre-ping and recycle settings shared with database.py
+    from database import engine_options, pool_status, apply_sqlite_profile, init_app as init_database
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    init_database(app)
+
     from models import db
     db.init_app(app)
 
-    from auth import auth, set_bcrypt_instance
+    from auth import auth, set_bcrypt_instance, set_password_hasher
     set_bcrypt_instance(bcrypt)
+    set_password_hasher(password_hasher)
     app.register_blueprint(auth, url_prefix="/auth")
 
+    from jobs import jobs, set_job_summarizer, set_job_admission, JobWorkerPool, JobCancelled
+    app.register_blueprint(jobs, url_prefix="/jobs")
+
+    from activities import activities
+    app.register_blueprint(activities, url_prefix="/activities")
+
+    from dashboard import dashboard, StatsReconciler
+    app.register_blueprint(dashboard, url_prefix="/dashboard")
+
+    from summaries import (summaries, set_write_batcher, input_hash, summary_params, optional_user_id,
+                           find_summaries, record_summary)
+    app.register_blueprint(summaries, url_prefix="/summaries")
+
+    from search import search, init_search
+    app.register_blueprint(search, url_prefix="/search")
+
     with app.app_context():
+        # WAL, cache and busy timeout pragmas on every SQLite connection
+        apply_sqlite_profile(db.engine)
         db.create_all()
+    
+    # Indexes added since a database was created, and QUERY_AUDIT logging
+    from db_maintenance import init_db_maintenance
+    init_db_maintenance(app, db)
+
+    # Full-text index over saved summaries, kept current by triggers (see search.py)
+    try:
+        with app.app_context():
+            init_search(db.engine)
+    except Exception as e:
+        print(f"Full-text search setup failed: {e}")
     DB_AVAILABLE = True
 except Exception as e:
     print(f"Warning: Database setup failed: {e}")
@@ -80,28 +130,157 @@ except Exception as e:
     print(f"Model loading failed: {e}")
     print(traceback.format_exc())
 
+# Optional distilled scorer (see distillation.py) for bulk "fast" tier traffic.
+# FAST_MODEL_PATH selects the pickle; by default it is the fast_extractive_model.pkl
+# that distillation.py writes, if one is found where the main model is looked for.
+fast_model, fast_preprocessor = None, None
+FAST_MODEL_PATH = os.getenv('FAST_MODEL_PATH') or find_fast_model_file()
+if FAST_MODEL_PATH:
+    try:
+        from LoadSummarizer import load_model_file
+        fast_model, fast_preprocessor = load_model_file(FAST_MODEL_PATH)
+    except Exception as e:
+        print(f"Fast model loading failed: {e}")
+
+# Stored summaries are reused only for the model version that produced them (see summaries.py)
+MODEL_VERSIONS = {}
+try:
+    from LoadSummarizer import DummyModel, find_model_file, model_file_version
+    if MODEL_AVAILABLE and not isinstance(model, DummyModel):
+        MODEL_VERSIONS['trained'] = os.getenv('MODEL_VERSION') or model_file_version(find_model_file())
+    if fast_model is not None:
+        MODEL_VERSIONS['fast'] = os.getenv('FAST_MODEL_VERSION') or model_file_version(FAST_MODEL_PATH)
+except Exception as e:
+    print(f"Model versioning failed, summary reuse disabled: {e}")
+
+# Background jobs (see jobs.py): queued in the app database, run by a local worker pool
+def run_summary_job(text, options, should_cancel):
+    max_sentences = options.get('max_sentences') or calculate_dynamic_summary_length(text)
+    active_model, active_preprocessor, model_used = model, preprocessor, 'trained'
+    if options.get('tier') == 'fast' and fast_model is not None and fast_preprocessor is not None:
+        active_model, active_preprocessor, model_used = fast_model, fast_preprocessor, 'fast'
+    elif not (MODEL_AVAILABLE and model and preprocessor):
+        raise RuntimeError("Model not available")
+    
+    summary = ''
+    for event, payload in stream_summary(active_model, text, active_preprocessor, max_sentences, checkpoint_every=0):
+        if should_cancel():
+            raise JobCancelled()
+        if event == 'summary':
+            summary = payload['summary']
+    return {
+        'summary': summary.strip(),
+        'model_used': model_used,
+        'original_length': len(text),
+        'summary_length': len(summary.strip()),
+        'sentences_used': max_sentences
+    }
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 1))
+job_pool = None
+if DB_AVAILABLE:
+    set_job_summarizer(run_summary_job)
+    if JOB_WORKERS > 0:
+        job_pool = JobWorkerPool(app, JOB_WORKERS).start()
+
+# Periodic recount of the dashboard aggregates, fixing any drift (see dashboard.py)
+STATS_RECONCILE_SECONDS = int(os.getenv('ACTIVITY_STATS_RECONCILE_SECONDS', 3600))
+if DB_AVAILABLE and STATS_RECONCILE_SECONDS > 0:
+    StatsReconciler(app, STATS_RECONCILE_SECONDS).start()
+
+# Non-critical inserts (history, analytics) are queued and written in batches
+write_batcher = None
+if DB_AVAILABLE:
+    from write_batcher import WriteBatcher
+    write_batcher = WriteBatcher.from_env(app, db).start()
+    atexit.register(write_batcher.stop)
+    set_write_batcher(write_batcher)
+
+# Concurrency and per-user rate limits for the summarization routes (see admission.py)
+from admission import AdmissionController, json_text_cost, upload_cost
+admission = AdmissionController.from_env()
+
+if DB_AVAILABLE:
+    set_job_admission(admission, json_text_cost)
+
+# Identical concurrent /summarize calls share one generate_summary run
+from coalesce import SingleFlight, content_key
+summary_flights = SingleFlight(timeout=float(os.getenv('COALESCE_TIMEOUT', 30)))
+
+# A request that will only wait for an identical in-flight computation is
+# admitted at this cost instead of its full estimate
+COALESCED_COST = 1
+
+def summarize_options(data):
+    """(text, max_sentences, threshold, model, preprocessor, model label) of a /summarize body, once per request"""
+    if 'summarize_options' not in g:
+        text = data.get('text', '').strip()
+        max_sentences = data.get('max_sentences')
+        if max_sentences is None and text:
+            max_sentences = calculate_dynamic_summary_length(text)
+        active_model, active_preprocessor, model_label = model, preprocessor, 'trained'
+        if data.get('tier') == 'fast' and fast_model is not None and fast_preprocessor is not None:
+            active_model, active_preprocessor, model_label = fast_model, fast_preprocessor, 'fast'
+        g.summarize_options = (text, max_sentences, data.get('threshold', 0.3),
+                               active_model, active_preprocessor, model_label)
+    return g.summarize_options
+
+def summary_flight_key(text, max_sentences, threshold, model_label):
+    return content_key(text, max_sentences=max_sentences, threshold=threshold, model=model_label)
+
+def summarize_cost():
+    """json_text_cost(), or COALESCED_COST when an identical summary is already being computed"""
+    try:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            text, max_sentences, threshold, _, _, model_label = summarize_options(data)
+            if text and summary_flights.in_flight(summary_flight_key(text, max_sentences, threshold, model_label)):
+                return COALESCED_COST
+    except Exception:
+        pass
+    return json_text_cost()
+
+# Per-document caches for /summarize/incremental
+from incremental import SessionStore, VersionConflict, resummarize, checked_int
+from uploads import UploadSummarizer, UnsupportedUpload, iter_multipart_file, iter_blocks, make_extractor
+sessions = SessionStore(max_sessions=int(os.getenv('INCREMENTAL_MAX_SESSIONS', 1000)),
+                        ttl=int(os.getenv('INCREMENTAL_SESSION_TTL', 1800)))
+
 # Routes
 @app.route('/summarize', methods=['POST'])
+@admission.limit(summarize_cost)
 def summarize_text():
     try:
         if not request.is_json:
             return jsonify({'error': 'Content-Type must be application/json'}), 400
         
         data = request.get_json()
-        text = data.get('text', '').strip()
+        text, max_sentences, threshold, active_model, active_preprocessor, model_label = summarize_options(data)
         if not text:
             return jsonify({'error': 'No text provided'}), 400
         
-        max_sentences = data.get('max_sentences')
-        threshold = data.get('threshold', 0.3)
+        coalesced = False
+        from_history = False
         
-        if max_sentences is None:
-            max_sentences = calculate_dynamic_summary_length(text)
+        model_version = MODEL_VERSIONS.get(model_label) if DB_AVAILABLE else None
+        stored = []
+        if model_version:
+            text_hash = input_hash(text)
+            params = summary_params(max_sentences=max_sentences, threshold=threshold)
+            user_id = optional_user_id()
+            try:
+                stored = find_summaries(text_hash, model_version, params)
+            except Exception as e:
+                print(f"Summary lookup failed: {e}")
         
-        if MODEL_AVAILABLE and model and preprocessor:
+        if stored:
+            summary, model_used, from_history = stored[0].summary, model_label, True
+        elif (MODEL_AVAILABLE or model_label == 'fast') and active_model and active_preprocessor:
             try:
-                summary = generate_summary(model, text, preprocessor, max_sentences, threshold)
-                model_used = 'trained'
+                key = summary_flight_key(text, max_sentences, threshold, model_label)
+                summary, coalesced = summary_flights.do(
+                    key, lambda: generate_summary(active_model, text, active_preprocessor, max_sentences, threshold))
+                model_used = model_label
             except Exception:
                 sentences = [s.strip() for s in text.split('.') if s.strip()]
                 summary = '. '.join(sentences[:max_sentences]) + '.' if len(sentences) > max_sentences else text
@@ -115,13 +294,20 @@ def summarize_text():
             summary = text[:200] + "..." if len(text) > 200 else text
             model_used += '_emergency_fallback'
         
+        # Save to history unless this user (or, anonymously, anyone) already has it
+        if model_version and model_used == model_label and not (
+                stored and (user_id is None or any(s.user_id == user_id for s in stored))):
+            record_summary(user_id, text, text_hash, params, model_version, summary.strip())
+        
         return jsonify({
             'summary': summary.strip(),
             'model_used': model_used,
             'status': 'success',
             'original_length': len(text),
             'summary_length': len(summary.strip()),
-            'sentences_used': max_sentences
+            'sentences_used': max_sentences,
+            'coalesced': coalesced,
+            'from_history': from_history
         })
         
     except Exception as e:
@@ -132,6 +318,143 @@ def summarize_text():
             'message': 'An unexpected error occurred during summarization'
         }), 500
 
+@app.route('/summarize/stream', methods=['POST'])
+@admission.limit(json_text_cost)
+def summarize_stream():
+    """Server-Sent Events version of /summarize: 'score' events per sentence, 'summary' events at checkpoints"""
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), 400
+    
+    data = request.get_json()
+    text = data.get('text') if isinstance(data, dict) else None
+    text = text.strip() if isinstance(text, str) else ''
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+    
+    try:
+        max_sentences = data.get('max_sentences')
+        max_sentences = (checked_int(max_sentences, 'max_sentences', 1) if max_sentences is not None
+                         else calculate_dynamic_summary_length(text))
+        checkpoint_every = checked_int(data.get('checkpoint_every', 5), 'checkpoint_every', 1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    active_model, active_preprocessor = model, preprocessor
+    if data.get('tier') == 'fast' and fast_model is not None and fast_preprocessor is not None:
+        active_model, active_preprocessor = fast_model, fast_preprocessor
+    elif not (MODEL_AVAILABLE and model and preprocessor):
+        return jsonify({'error': 'Model not available'}), 503
+    
+    def events():
+        try:
+            for event, payload in stream_summary(active_model, text, active_preprocessor, max_sentences,
+                                                 checkpoint_every):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            print("Error in /summarize/stream:", traceback.format_exc())
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    
+    # No proxy buffering, or the events arrive all at once
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/summarize/upload', methods=['POST'])
+@admission.limit(upload_cost)
+def summarize_upload():
+    """Summarize a .txt/.md/.html upload: multipart 'file' field, or the raw body with ?filename="""
+    try:
+        if request.mimetype == 'multipart/form-data':
+            boundary = request.mimetype_params.get('boundary')
+            if not boundary:
+                return jsonify({'error': 'Missing multipart boundary'}), 400
+            parts = iter_multipart_file(request.stream, boundary)
+        else:
+            filename = request.args.get('filename') or request.headers.get('X-Filename')
+            make_extractor(filename)  # reject unsupported types before reading the body
+            parts = ((filename, block) for block in iter_blocks(request.stream))
+        
+        reader = None
+        for filename, data in parts:
+            if reader is None:
+                reader = UploadSummarizer(filename)
+            reader.feed(data)
+        if reader is None:
+            return jsonify({'error': 'Uploaded file is empty'}), 400
+        reader.close()
+        if not reader.sentences:
+            return jsonify({'error': 'No text found in uploaded file'}), 400
+        
+        max_sentences = request.args.get('max_sentences', type=int)
+        if max_sentences is None:
+            max_sentences = summary_length_from_counts(reader.word_count, len(reader.sentences))
+        
+        if MODEL_AVAILABLE and model and preprocessor:
+            summary = summarize_sentences(model, reader.sentences, preprocessor, max_sentences)
+            model_used = 'trained'
+        else:
+            summary = '. '.join(reader.sentences[:max_sentences]) + '.'
+            model_used = 'fallback'
+        
+        return jsonify({
+            'summary': summary.strip(),
+            'model_used': model_used,
+            'status': 'success',
+            'document': reader.stats(),
+            'summary_length': len(summary.strip()),
+            'sentences_used': max_sentences
+        })
+        
+    except RequestEntityTooLarge:
+        raise
+    except UnsupportedUpload as e:
+        return jsonify({'error': str(e)}), 415
+    except Exception as e:
+        print("Error in /summarize/upload:", traceback.format_exc())
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@app.route('/summarize/incremental', methods=['POST'])
+@admission.limit(json_text_cost)
+def summarize_incremental():
+    """Summarize an edited document: send {doc_id, version, edits} or the full {text}"""
+    try:
+        if not request.is_json:
+            return jsonify({'error': 'Content-Type must be application/json'}), 400
+        if not (MODEL_AVAILABLE and model and preprocessor):
+            return jsonify({'error': 'Model not available'}), 503
+        
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        text = data.get('text')
+        edits = data.get('edits')
+        if text is None and edits is None:
+            return jsonify({'error': 'Provide text or edits'}), 400
+        
+        try:
+            summary, document, stats = resummarize(sessions, model, preprocessor, data.get('doc_id'), text,
+                                                   edits, data.get('version'), data.get('max_sentences'))
+        except KeyError:
+            return jsonify({'error': 'Unknown or expired doc_id, resend full text', 'status': 'resync'}), 404
+        except VersionConflict as e:
+            return jsonify({'error': str(e), 'status': 'resync'}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'summary': summary.strip(),
+            'doc_id': document['doc_id'],
+            'version': document['version'],
+            'model_used': 'trained',
+            'status': 'success',
+            'original_length': document['length'],
+            'summary_length': len(summary.strip()),
+            'incremental': stats
+        })
+        
+    except Exception as e:
+        print("Error in /summarize/incremental:", traceback.format_exc())
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
 @app.route('/health', methods=['GET'])
 def health_check():
     try:
@@ -140,7 +463,14 @@ def health_check():
             'model_available': MODEL_AVAILABLE,
             'model_loaded': model is not None,
             'preprocessor_loaded': preprocessor is not None,
-            'database_available': DB_AVAILABLE
+            'fast_model_loaded': fast_model is not None,
+            'job_workers': job_pool.workers if job_pool else 0,
+            'coalescing': summary_flights.snapshot(),
+            'admission': admission.snapshot(),
+            'password_hashing': password_hasher.snapshot() if password_hasher else None,
+            'database_available': DB_AVAILABLE,
+            'database_pool': pool_status(db.engine) if DB_AVAILABLE else None,
+            'write_batcher': write_batcher.snapshot() if write_batcher else None
         }
         return jsonify(health_status)
     except Exception as e:
@@ -2,18 +2,46 @@
 from flask import Blueprint, request, jsonify
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import create_access_token
+from sqlalchemy.exc import IntegrityError
 from models import db, User
+from password_hashing import HasherBusy
 import datetime
 import traceback
 
 auth = Blueprint("auth", __name__)
 bcrypt = Bcrypt()
+password_hasher = None
 
 def set_bcrypt_instance(bcrypt_instance):
     """Set the bcrypt instance for the auth blueprint"""
     global bcrypt
     bcrypt = bcrypt_instance
 
+def set_password_hasher(hasher):
+    """Hash and verify passwords on this PasswordHasher's process pool instead of inline"""
+    global password_hasher
+    password_hasher = hasher
+
+def hash_password(password):
+    if password_hasher is not None:
+        return password_hasher.hash_password(password)
+    return bcrypt.generate_password_hash(password).decode('utf-8')
+
+def check_password(hashed, password):
+    if password_hasher is not None:
+        return password_hasher.check_password(hashed, password)
+    return bcrypt.check_password_hash(hashed, password)
+
+def current_user_id():
+    """User id of the verified JWT"""
+    from flask_jwt_extended import get_jwt_identity
+    return int(get_jwt_identity())
+
+def busy_response():
+    response = jsonify({"error": "Server busy, please try again shortly"})
+    response.headers['Retry-After'] = '2'
+    return response, 503
+
 def validate_email(email):
     """Basic email validation"""
     import re
@@ -74,7 +102,7 @@ def signup():
                 return jsonify({"error": "Username already exists"}), 409
         
         # Create new user
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = hash_password(password)
         new_user = User(
             username=username,
             email=email,
@@ -82,7 +110,14 @@ def signup():
         )
         
         db.session.add(new_user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent signup took the email or username after the check above
+            db.session.rollback()
+            if User.query.filter_by(email=email).first():
+                return jsonify({"error": "Email already exists"}), 409
+            return jsonify({"error": "Username already exists"}), 409
         
         print(f"User created successfully: {username} ({email})")
         
@@ -94,6 +129,9 @@ def signup():
             }
         }), 201
         
+    except HasherBusy:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         print(f"Signup error: {str(e)}")
@@ -128,11 +166,18 @@ def login():
         user = User.query.filter_by(email=email).first()
         
         # Verify credentials
-        if user and bcrypt.check_password_hash(user.password, password):
+        if user and check_password(user.password, password):
+            # Hashes made with an older, cheaper cost are upgraded while the password is at hand
+            if password_hasher is not None and password_hasher.needs_rehash(user.password):
+                user.password = hash_password(password)
+                db.session.commit()
+                print(f"Rehashed password for {user.email} at {password_hasher.rounds} rounds")
+            
             # Create access token
+            # The subject has to be a string for PyJWT; the rest travels as claims
             access_token = create_access_token(
-                identity={
-                    "id": user.id,
+                identity=str(user.id),
+                additional_claims={
                     "email": user.email,
                     "username": user.username
                 },
@@ -155,6 +200,9 @@ def login():
             print(f"Login failed for email: {email}")
             return jsonify({"error": "Invalid email or password"}), 401
             
+    except HasherBusy:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         print(f"Login error: {str(e)}")
         print(traceback.format_exc())
@@ -167,14 +215,18 @@ def login():
 def verify_token():
     """Verify JWT token endpoint"""
     try:
-        from flask_jwt_extended import jwt_required, get_jwt_identity
+        from flask_jwt_extended import jwt_required, get_jwt
         
         @jwt_required()
         def _verify():
-            current_user = get_jwt_identity()
+            claims = get_jwt()
             return jsonify({
                 "valid": True,
-                "user": current_user
+                "user": {
+                    "id": current_user_id(),
+                    "email": claims.get("email"),
+                    "username": claims.get("username")
+                }
             }), 200
         
         return _verify()
@@ -0,0 +1,133 @@
+import os
+import glob
+import pickle
+import random
+import threading
+import numpy as np
+
+from training import model_state, get_parameters, set_parameter
+
+# Resumable training checkpoints.
+#
+# A checkpoint is a pickled dict in the same 'config'/'model_params'/
+# 'preprocessor' layout that LoadSummarizer.load_model() accepts, plus:
+#   'optimizer'      optimizer.state_dict()
+#   'rng'            numpy and random module RNG states
+#   'position'       {'epoch', 'document'} -- where the data iterator resumes
+#   'step'           number of optimizer steps taken
+#   'args'           training options, for the resume command
+#
+# The training thread only takes an in-memory snapshot; a background thread
+# pickles it to a temp file and atomically renames it into place. If a newer
+# snapshot arrives while one is still being written, it replaces the pending
+# one, so the training loop never waits on disk.
+
+CHECKPOINT_PATTERN = 'checkpoint-{step:08d}.pkl'
+
+
+def capture_state(engine, preprocessor, epoch, document, args=None):
+    """Snapshot everything needed to continue training bit-exactly"""
+    state = model_state(engine.model)
+    state['preprocessor'] = preprocessor
+    state['optimizer'] = engine.optimizer.state_dict()
+    state['rng'] = {'numpy': np.random.get_state(), 'random': random.getstate()}
+    state['position'] = {'epoch': epoch, 'document': document}
+    state['step'] = engine.step_count
+    state['args'] = dict(args or {})
+    return state
+
+
+def restore_state(engine, state):
+    """Load parameters, optimizer state and RNG state into a fresh engine"""
+    params = get_parameters(engine.model)
+    for part, attrs in state['model_params'].items():
+        for attr, value in attrs.items():
+            name = f"{part}.{attr}"
+            set_parameter(engine.model, name, np.array(value, dtype=params[name].dtype))
+    engine.optimizer.load_state_dict(state['optimizer'])
+    engine.step_count = state['step']
+    np.random.set_state(state['rng']['numpy'])
+    random.setstate(state['rng']['random'])
+    return state['position']['epoch'], state['position']['document']
+
+
+def write_checkpoint(path, state):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def list_checkpoints(directory):
+    return sorted(glob.glob(os.path.join(directory, CHECKPOINT_PATTERN.replace('{step:08d}', '*'))))
+
+
+def latest_checkpoint(directory):
+    checkpoints = list_checkpoints(directory)
+    return checkpoints[-1] if checkpoints else None
+
+
+class CheckpointWriter:
+    """Writes checkpoint snapshots from a background thread"""
+
+    def __init__(self, directory, keep=3):
+        self.directory = directory
+        self.keep = keep
+        self.written = []
+        self.error = None
+        os.makedirs(directory, exist_ok=True)
+        self._pending = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save(self, state):
+        """Queue a snapshot; replaces any snapshot not yet picked up"""
+        if self.error is not None:
+            raise self.error
+        with self._cond:
+            self._pending = state
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                state, self._pending = self._pending, None
+            try:
+                path = os.path.join(self.directory, CHECKPOINT_PATTERN.format(step=state['step']))
+                write_checkpoint(path, state)
+                self.written.append(path)
+                self._prune()
+            except Exception as e:
+                print(f"Checkpoint write failed: {e}")
+                self.error = e
+
+    def _prune(self):
+        if not self.keep:
+            return
+        for path in list_checkpoints(self.directory)[:-self.keep]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def close(self):
+        """Finish writing the pending snapshot and stop the thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import threading
+
+# Single-flight request coalescing.
+#
+# The first caller for a key (the leader) runs the computation; callers that
+# arrive with the same key while it is running wait for the leader and get
+# its result instead of computing it again. A waiter that has waited longer
+# than the timeout computes the result itself. Nothing is cached: once the
+# leader finishes, the next call with that key starts a new computation.
+
+
+def content_key(text, **params):
+    """Key for text plus the parameters that change the result"""
+    digest = hashlib.sha256(text.encode('utf-8'))
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, timeout=30.0):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {'leaders': 0, 'coalesced': 0, 'timeouts': 0, 'errors': 0}
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() once per key among concurrent callers; returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats['leaders'] += 1
+            else:
+                call.waiters += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+                with self._lock:
+                    self.stats['errors'] += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result, False
+
+        if not call.done.wait(self.timeout if timeout is None else timeout):
+            with self._lock:
+                self.stats['timeouts'] += 1
+            return fn(), False
+        with self._lock:
+            self.stats['coalesced'] += 1
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def in_flight(self, key):
+        """Whether a computation for key is running now (a do() would wait for it)"""
+        with self._lock:
+            return key in self._calls
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
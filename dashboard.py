@@ -0,0 +1,276 @@
+# dashboard.py
+import os
+import time
+import threading
+import traceback
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy import event, func, inspect, case, false
+from sqlalchemy.orm import Session
+from models import db, Activity, ActivityStats, ActivityDailyStats
+from auth import current_user_id
+
+# Dashboard counts without scanning activities.
+#
+# activity_stats holds each user's total and completed counts, and
+# activity_daily_stats the same counts per due day. A before_flush hook turns
+# every inserted, deleted or changed Activity in the flush into count deltas
+# and applies them in the same transaction, so the counts move with the rows.
+# Overdue (open and due before today) is the open total minus open items due
+# today or later, so /dashboard/stats reads the summary row plus the daily
+# rows from the requested weeks onward -- never the user's full history.
+#
+# Counter rows are changed with one upsert per row, so two transactions
+# adding the first activity of a (user, day) cannot both try to insert it.
+#
+# Writes that bypass the ORM (raw SQL, manual edits) are not seen by the hook;
+# reconcile_stats() recounts from activities and a background thread runs it
+# every ACTIVITY_STATS_RECONCILE_SECONDS. It compares and rewrites the counts
+# in one transaction that first locks the users' activity_stats rows (the
+# whole database on SQLite), so activity writes for those users wait for it.
+# Elsewhere, a user whose first stats row is created during a run has no row
+# to lock; if that leaves their counts off, the next run corrects them.
+
+
+def _value_before(state, attr):
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else getattr(state.object, attr)
+
+
+def _key(user_id, when):
+    return user_id, when.date() if isinstance(when, datetime) else when
+
+
+def collect_deltas(session):
+    """{(user_id, day): [total_delta, completed_delta]} for the pending flush"""
+    deltas = defaultdict(lambda: [0, 0])
+
+    def add(user_id, when, completed, sign):
+        if user_id is None or when is None:
+            return
+        delta = deltas[_key(user_id, when)]
+        delta[0] += sign
+        delta[1] += sign if completed else 0
+
+    for obj in session.new:
+        if isinstance(obj, Activity):
+            add(obj.user_id, obj.date, obj.completed, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Activity):
+            state = inspect(obj)
+            add(_value_before(state, 'user_id'), _value_before(state, 'date'),
+                _value_before(state, 'completed'), -1)
+    for obj in session.dirty:
+        if isinstance(obj, Activity) and session.is_modified(obj):
+            state = inspect(obj)
+            before = tuple(_value_before(state, a) for a in ('user_id', 'date', 'completed'))
+            after = (obj.user_id, obj.date, obj.completed)
+            if before != after:
+                add(*before, -1)
+                add(*after, 1)
+    return {key: delta for key, delta in deltas.items() if delta != [0, 0]}
+
+
+def _bump(conn, table, key_columns, key_values, total, completed):
+    """Add to a counter row, creating it if needed, in a single upsert"""
+    values = dict(zip(key_columns, key_values), total=total, completed=completed)
+    dialect_name = conn.dialect.name
+    if dialect_name in ('sqlite', 'postgresql'):
+        if dialect_name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).values(**values)
+        conn.execute(statement.on_conflict_do_update(index_elements=list(key_columns), set_={
+            'total': table.c.total + statement.excluded.total,
+            'completed': table.c.completed + statement.excluded.completed}))
+        return
+    if dialect_name in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table).values(**values)
+        conn.execute(statement.on_duplicate_key_update(total=table.c.total + statement.inserted.total,
+                                                       completed=table.c.completed + statement.inserted.completed))
+        return
+    # Other databases: update, then insert if there was no row
+    where = [getattr(table.c, column) == value for column, value in zip(key_columns, key_values)]
+    result = conn.execute(table.update().where(*where).values(
+        total=table.c.total + total, completed=table.c.completed + completed))
+    if result.rowcount == 0:
+        conn.execute(table.insert().values(**values))
+
+
+def apply_deltas(conn, deltas):
+    per_user = defaultdict(lambda: [0, 0])
+    for (user_id, day), (total, completed) in deltas.items():
+        _bump(conn, ActivityDailyStats.__table__, ('user_id', 'day'), (user_id, day), total, completed)
+        per_user[user_id][0] += total
+        per_user[user_id][1] += completed
+    for user_id, (total, completed) in per_user.items():
+        _bump(conn, ActivityStats.__table__, ('user_id',), (user_id,), total, completed)
+
+
+@event.listens_for(Session, 'before_flush')
+def _maintain_stats(session, flush_context, instances):
+    deltas = collect_deltas(session)
+    if deltas:
+        # session.connection() runs on the flush's transaction without autoflushing
+        apply_deltas(session.connection(), deltas)
+
+
+def _locked_stats(user_ids):
+    """The users' ActivityStats rows, locked until the transaction ends"""
+    stats_query = ActivityStats.query
+    if user_ids is not None:
+        stats_query = stats_query.filter(ActivityStats.user_id.in_(user_ids))
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # No row locks: a write statement takes the database write lock instead
+        ActivityStats.query.filter(false()).update({'total': ActivityStats.total}, synchronize_session=False)
+        return stats_query.all()
+    return stats_query.with_for_update().all()
+
+
+def reconcile_stats(user_ids=None):
+    """Recount the aggregate tables from activities; returns the number of users fixed"""
+    # Stored counts are read, and locked, before the activities are counted
+    stored_stats = _locked_stats(user_ids)
+    stored_query = ActivityDailyStats.query
+    if user_ids is not None:
+        stored_query = stored_query.filter(ActivityDailyStats.user_id.in_(user_ids))
+    stored_daily = {(row.user_id, row.day): (row.total, row.completed) for row in stored_query}
+
+    day = func.date(Activity.date)
+    query = db.session.query(Activity.user_id, day, func.count(Activity.id),
+                             func.sum(case((Activity.completed == True, 1), else_=0)))  # noqa: E712
+    if user_ids is not None:
+        query = query.filter(Activity.user_id.in_(user_ids))
+    actual_daily = {}
+    for user_id, when, total, completed in query.group_by(Activity.user_id, day):
+        when = date.fromisoformat(when) if isinstance(when, str) else when
+        actual_daily[(user_id, when)] = (total, int(completed or 0))
+
+    drifted = {key[0] for key in set(actual_daily) | set(stored_daily)
+               if actual_daily.get(key, (0, 0)) != stored_daily.get(key, (0, 0))}
+    actual_totals = defaultdict(lambda: [0, 0])
+    for (user_id, _), (total, completed) in actual_daily.items():
+        actual_totals[user_id][0] += total
+        actual_totals[user_id][1] += completed
+    for row in stored_stats:
+        if [row.total, row.completed] != actual_totals.get(row.user_id, [0, 0]):
+            drifted.add(row.user_id)
+    drifted |= set(actual_totals) - {row.user_id for row in stored_stats}
+    if not drifted:
+        db.session.commit()  # release the locks
+        return 0
+
+    drifted = sorted(drifted)
+    ActivityDailyStats.query.filter(ActivityDailyStats.user_id.in_(drifted)).delete(synchronize_session=False)
+    ActivityStats.query.filter(ActivityStats.user_id.in_(drifted)).delete(synchronize_session=False)
+    now = datetime.utcnow()
+    for (user_id, when), (total, completed) in actual_daily.items():
+        if user_id in drifted:
+            db.session.add(ActivityDailyStats(user_id=user_id, day=when, total=total, completed=completed))
+    for user_id in drifted:
+        total, completed = actual_totals.get(user_id, [0, 0])
+        db.session.add(ActivityStats(user_id=user_id, total=total, completed=completed, updated_at=now))
+    db.session.commit()
+    print(f"Reconciled activity stats for {len(drifted)} users")
+    return len(drifted)
+
+
+class StatsReconciler:
+    """Runs reconcile_stats() now and then every interval seconds"""
+
+    def __init__(self, app, interval=3600):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    reconcile_stats()
+                except Exception:
+                    db.session.rollback()
+                    print("Activity stats reconciliation failed:", traceback.format_exc())
+                finally:
+                    db.session.remove()
+                self._stop.wait(self.interval)
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def user_stats(user_id, weeks=8, today=None):
+    today = today or datetime.utcnow().date()
+    first_week = week_start(today) - timedelta(weeks=weeks - 1)
+    summary = db.session.get(ActivityStats, user_id)
+    total, completed = (summary.total, summary.completed) if summary else (0, 0)
+
+    # Daily rows from the oldest week shown onward; future days are included
+    rows = ActivityDailyStats.query.filter(ActivityDailyStats.user_id == user_id,
+                                           ActivityDailyStats.day >= min(first_week, today)).all()
+    open_from_today = sum(r.total - r.completed for r in rows if r.day >= today)
+    by_week = defaultdict(lambda: [0, 0])
+    for r in rows:
+        by_week[week_start(r.day)][0] += r.total
+        by_week[week_start(r.day)][1] += r.completed
+
+    return {
+        "total": total,
+        "completed": completed,
+        "open": total - completed,
+        "overdue": total - completed - open_from_today,
+        "weeks": [
+            {"week_start": (first_week + timedelta(weeks=i)).isoformat(),
+             "total": by_week[first_week + timedelta(weeks=i)][0],
+             "completed": by_week[first_week + timedelta(weeks=i)][1]}
+            for i in range(weeks)
+        ],
+    }
+
+
+dashboard = Blueprint("dashboard", __name__)
+
+@dashboard.route('/stats', methods=['GET'])
+@jwt_required()
+def stats():
+    """Activity counts for the dashboard; ?weeks= recent weeks (default 8)"""
+    try:
+        weeks = min(max(request.args.get("weeks", 8, type=int), 1), 104)
+        return jsonify(user_stats(current_user_id(), weeks))
+    except Exception as e:
+        print(f"Dashboard stats error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": "Failed to load dashboard stats"}), 500
+
+
+if __name__ == "__main__":
+    import argparse
+    from flask import Flask
+
+    parser = argparse.ArgumentParser(description="Recount dashboard activity stats from the activities table")
+    parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///mydb.sqlite3')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        start = time.time()
+        fixed = reconcile_stats()
+    print(f"{fixed} users reconciled in {time.time() - start:.1f}s")
@@ -1,13 +1,191 @@
-import mysql.connector
 import os
+import time
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.pool import QueuePool
 load_dotenv()
 
-conn = mysql.connector.connect(
-    host = os.getenv("DB_HOST"),
-    user = os.getenv("DB_USER"),
-    password = os.getenv("DB_PASSWORD"),
-    database = os.getenv("DB_NAME")
-)
+# Pooled database connections.
+#
+# This module used to open one mysql.connector connection and cursor at import
+# time, shared by every importer and thread and never reconnected. Connections
+# now come from a pool instead: checked out when needed (at most once per
+# request through get_db()) and returned when the request ends.
+#
+# The pool settings are read from the environment and shared with the app's
+# SQLAlchemy engine through engine_options():
+#   DB_POOL_SIZE       connections kept open (default 5)
+#   DB_MAX_OVERFLOW    extra connections allowed under load (default 10)
+#   DB_POOL_TIMEOUT    seconds to wait for a free connection (default 30)
+#   DB_POOL_RECYCLE    seconds before a connection is replaced (default 1800),
+#                      so the server's wait_timeout never closes one under us
+#   DB_POOL_PRE_PING   test each connection on checkout (default on)
+# Both pools record how long checkouts waited, reported by pool_status().
+#
+# The legacy DB_HOST / DB_USER / DB_PASSWORD / DB_NAME settings still select a
+# MySQL server; without them DATABASE_URL (or the local SQLite file) is used.
+#
+# SQLite engines get a performance profile on every new connection (unless
+# SQLITE_PROFILE=off): WAL journaling, so readers no longer block the writer
+# or each other; synchronous=NORMAL, which is durable in WAL mode except for
+# the last commits before a power loss; a larger page cache and memory-mapped
+# reads; and a busy timeout so a writer waits for the lock instead of failing.
+# Each pragma can be overridden with SQLITE_<NAME>, e.g. SQLITE_MMAP_SIZE=0.
 
-cursor = conn.cursor(dictionary = True)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,        # KiB when negative: 64 MB per connection
+    'mmap_size': 268435456,      # 256 MB
+    'busy_timeout': 5000,        # ms
+    'temp_store': 'MEMORY',
+}
+
+
+def pool_settings():
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes'),
+    }
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.metrics = {'checkouts': 0, 'timeouts': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.metrics['timeouts'] += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._metrics_lock:
+            self.metrics['checkouts'] += 1
+            self.metrics['wait_seconds_total'] += waited
+            self.metrics['wait_seconds_max'] = max(self.metrics['wait_seconds_max'], waited)
+        return conn
+
+
+def _in_memory_sqlite(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(url):
+    """create_engine() keyword arguments applying the pool settings to url"""
+    settings = pool_settings()
+    if _in_memory_sqlite(url):
+        # One shared connection (StaticPool); there is nothing to size or recycle
+        return {'pool_pre_ping': settings['pool_pre_ping']}
+    return dict(settings, poolclass=MeteredQueuePool)
+
+
+def sqlite_pragmas():
+    return {name: os.getenv(f'SQLITE_{name.upper()}', value) for name, value in SQLITE_PRAGMAS.items()}
+
+
+def apply_sqlite_profile(engine):
+    """Run the SQLite pragmas on each new connection of engine; no-op for other databases"""
+    if engine.dialect.name != 'sqlite' or os.getenv('SQLITE_PROFILE', 'on').lower() in ('0', 'off', 'false', 'no'):
+        return False
+    pragmas = sqlite_pragmas()
+    if _in_memory_sqlite(engine.url):
+        pragmas.pop('journal_mode')  # in-memory databases cannot use WAL
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+    return True
+
+
+def database_url():
+    if os.getenv("DB_HOST"):
+        return URL.create(
+            "mysql+mysqlconnector",
+            username=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            host=os.getenv("DB_HOST"),
+            port=int(os.getenv("DB_PORT")) if os.getenv("DB_PORT") else None,
+            database=os.getenv("DB_NAME"),
+        )
+    return os.getenv('DATABASE_URL', 'sqlite:///mydb.sqlite3')
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The module's engine, created on first use rather than at import"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            url = database_url()
+            _engine = create_engine(url, **engine_options(url))
+            apply_sqlite_profile(_engine)
+        return _engine
+
+
+@contextmanager
+def connection():
+    """A pooled DB-API connection, returned to the pool when the block exits"""
+    conn = get_engine().raw_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def get_db():
+    """The current request's connection, checked out on first use"""
+    from flask import g
+    if 'db_conn' not in g:
+        g.db_conn = get_engine().raw_connection()
+    return g.db_conn
+
+
+def close_db(exception=None):
+    from flask import g
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        if exception is not None:
+            conn.rollback()
+        conn.close()
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
+
+
+def pool_status(engine=None):
+    """Size, usage and checkout wait times of engine's pool (the module's own by default)"""
+    pool = (engine or get_engine()).pool
+    status = {'pool': pool.__class__.__name__}
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow(),
+                      idle=pool.checkedin())
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        with pool._metrics_lock:
+            metrics = dict(metrics)
+        count = max(metrics['checkouts'], 1)
+        status.update(checkouts=metrics['checkouts'], timeouts=metrics['timeouts'],
+                      mean_wait_ms=metrics['wait_seconds_total'] / count * 1000,
+                      max_wait_ms=metrics['wait_seconds_max'] * 1000)
+    return status
@@ -0,0 +1,278 @@
+import os
+import json
+import pickle
+import queue
+import threading
+import numpy as np
+
+from model_classes import split_into_sentences
+
+# Pre-tokenized training data stored as memory-mapped int32 shards.
+#
+# Layout of a dataset directory:
+#   manifest.json                 shard list, document/sentence/token counts
+#   shard-00000/tokens.npy        int32, every token of the shard back to back
+#   shard-00000/token_offsets.npy int32, sentence i is tokens[off[i]:off[i+1]]
+#   shard-00000/doc_offsets.npy   int32, document j is sentences doc_off[j]:doc_off[j+1]
+#   shard-00000/labels.npy        int8, one extractive 0/1 label per sentence
+#
+# Corpus input is JSON lines. Each record has either "sentences" (a list of
+# strings) or "text" (split with split_into_sentences), plus "labels" with one
+# entry per sentence.
+
+MANIFEST_NAME = 'manifest.json'
+SHARD_FILES = ('tokens', 'token_offsets', 'doc_offsets', 'labels')
+
+
+def load_preprocessor(path):
+    """Load a TextPreprocessor pickle or the preprocessor inside a model pickle"""
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    if isinstance(data, dict) and 'preprocessor' in data:
+        return data['preprocessor']
+    return data
+
+
+def iter_labeled_corpus(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            sentences = record.get('sentences')
+            if sentences is None:
+                sentences = split_into_sentences(record.get('text', ''))
+            labels = record.get('labels', [])
+            if len(labels) != len(sentences):
+                print(f"Skipping line {line_no}: {len(sentences)} sentences but {len(labels)} labels")
+                continue
+            yield sentences, labels
+
+
+def _save_atomic(path, array):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class ShardWriter:
+    """Accumulates tokenized documents and flushes them as fixed-size shards"""
+
+    def __init__(self, output_dir, docs_per_shard=10000):
+        self.output_dir = output_dir
+        self.docs_per_shard = docs_per_shard
+        self.shards = []
+        self._reset()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _reset(self):
+        self._tokens = []
+        self._token_offsets = [0]
+        self._doc_offsets = [0]
+        self._labels = []
+
+    def add(self, sentence_indices, labels):
+        for indices in sentence_indices:
+            self._tokens.append(np.asarray(indices, dtype=np.int32))
+            self._token_offsets.append(self._token_offsets[-1] + len(indices))
+        self._labels.extend(int(label) for label in labels)
+        self._doc_offsets.append(len(self._labels))
+        if len(self._doc_offsets) - 1 >= self.docs_per_shard:
+            self.flush()
+
+    def flush(self):
+        num_docs = len(self._doc_offsets) - 1
+        if num_docs == 0:
+            return
+        if self._token_offsets[-1] > np.iinfo(np.int32).max:
+            raise ValueError("Shard exceeds int32 token offsets; lower docs_per_shard")
+
+        name = f"shard-{len(self.shards):05d}"
+        shard_dir = os.path.join(self.output_dir, name)
+        os.makedirs(shard_dir, exist_ok=True)
+        tokens = np.concatenate(self._tokens) if self._tokens else np.zeros(0, dtype=np.int32)
+        arrays = {
+            'tokens': tokens.astype(np.int32, copy=False),
+            'token_offsets': np.asarray(self._token_offsets, dtype=np.int32),
+            'doc_offsets': np.asarray(self._doc_offsets, dtype=np.int32),
+            'labels': np.asarray(self._labels, dtype=np.int8),
+        }
+        for key in SHARD_FILES:
+            _save_atomic(os.path.join(shard_dir, key + '.npy'), arrays[key])
+
+        self.shards.append({
+            'name': name,
+            'documents': num_docs,
+            'sentences': len(self._labels),
+            'tokens': int(tokens.shape[0]),
+        })
+        self._reset()
+
+    def close(self, **extra):
+        self.flush()
+        manifest = {
+            'format': 1,
+            'shards': self.shards,
+            'documents': sum(s['documents'] for s in self.shards),
+            'sentences': sum(s['sentences'] for s in self.shards),
+            'tokens': sum(s['tokens'] for s in self.shards),
+        }
+        manifest.update(extra)
+        tmp_path = os.path.join(self.output_dir, MANIFEST_NAME + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.output_dir, MANIFEST_NAME))
+        return manifest
+
+
+def build_shards(corpus_path, preprocessor, output_dir, docs_per_shard=10000):
+    """Tokenize a labeled JSONL corpus once into memory-mapped shards"""
+    writer = ShardWriter(output_dir, docs_per_shard)
+    for sentences, labels in iter_labeled_corpus(corpus_path):
+        writer.add([preprocessor.text_to_indices(s) for s in sentences], labels)
+    manifest = writer.close(vocab_size=len(preprocessor.word_to_idx))
+    print(f"Wrote {manifest['documents']} documents in {len(manifest['shards'])} shards to {output_dir}")
+    return manifest
+
+
+class Shard:
+    """One shard's arrays, memory-mapped (or fully loaded) from disk"""
+
+    def __init__(self, shard_dir, in_memory=False):
+        self.path = shard_dir
+        arrays = {}
+        for key in SHARD_FILES:
+            array = np.load(os.path.join(shard_dir, key + '.npy'), mmap_mode='r')
+            arrays[key] = np.array(array) if in_memory else array
+        self.tokens = arrays['tokens']
+        self.token_offsets = arrays['token_offsets']
+        self.doc_offsets = arrays['doc_offsets']
+        self.labels = arrays['labels']
+
+    def __len__(self):
+        return len(self.doc_offsets) - 1
+
+    def warm(self):
+        """Fault every page of the memory maps in ahead of use"""
+        for array in (self.tokens, self.token_offsets, self.doc_offsets, self.labels):
+            step = max(1, 4096 // array.itemsize)
+            int(array[::step].sum())
+
+    def document(self, j):
+        """Return (sentence index arrays, labels) for document j without copying"""
+        first, last = int(self.doc_offsets[j]), int(self.doc_offsets[j + 1])
+        offsets = self.token_offsets[first:last + 1]
+        sentences = [self.tokens[offsets[i]:offsets[i + 1]] for i in range(last - first)]
+        return sentences, self.labels[first:last]
+
+
+class ShardedDataset:
+    """Iterates documents from a shard directory with shuffling and prefetching.
+
+    Shards are opened by a background thread `prefetch` shards ahead of the
+    consumer. With cache=True loaded shards are kept in RAM, so every epoch
+    after the first touches no disk at all; otherwise repeated epochs are
+    served from the OS page cache through the memory maps.
+
+    rank/world_size select a disjoint subset of shards (every world_size-th
+    shard starting at rank) for data-parallel workers.
+    """
+
+    def __init__(self, data_dir, shuffle=True, seed=0, prefetch=2, cache=False, rank=0, world_size=1):
+        self.data_dir = data_dir
+        self.shuffle = shuffle
+        self.seed = seed
+        self.prefetch = max(1, prefetch)
+        self.cache = cache
+        self._cache = {}
+        with open(os.path.join(data_dir, MANIFEST_NAME)) as f:
+            self.manifest = json.load(f)
+        self.shards = self.manifest['shards'][rank::world_size]
+        self.shard_names = [s['name'] for s in self.shards]
+
+    def __len__(self):
+        return sum(s['documents'] for s in self.shards)
+
+    def _open_shard(self, name):
+        shard = self._cache.get(name)
+        if shard is None:
+            shard = Shard(os.path.join(self.data_dir, name), in_memory=self.cache)
+            if not self.cache:
+                shard.warm()
+            else:
+                self._cache[name] = shard
+        return shard
+
+    def epoch_order(self, epoch):
+        """Deterministic (shard order, per-shard document orders) for an epoch"""
+        rng = np.random.RandomState(self.seed + epoch)
+        shard_order = list(range(len(self.shard_names)))
+        if self.shuffle:
+            rng.shuffle(shard_order)
+        doc_orders = {}
+        for s in shard_order:
+            n = self.shards[s]['documents']
+            doc_orders[s] = rng.permutation(n) if self.shuffle else np.arange(n)
+        return shard_order, doc_orders
+
+    def iter_epoch(self, epoch=0, start=0):
+        """Yield the epoch's documents, skipping the first `start` of them"""
+        shard_order, doc_orders = self.epoch_order(epoch)
+        # Skipped shards are never opened
+        while shard_order and start >= len(doc_orders[shard_order[0]]):
+            start -= len(doc_orders[shard_order[0]])
+            shard_order = shard_order[1:]
+        if shard_order:
+            doc_orders[shard_order[0]] = doc_orders[shard_order[0]][start:]
+        loaded = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        def producer():
+            try:
+                for s in shard_order:
+                    if stop.is_set():
+                        return
+                    loaded.put((s, self._open_shard(self.shard_names[s])))
+            except Exception as e:
+                loaded.put((None, e))
+                return
+            loaded.put((None, None))
+
+        thread = threading.Thread(target=producer, daemon=True)
+        thread.start()
+        try:
+            while True:
+                s, shard = loaded.get()
+                if s is None:
+                    if shard is not None:
+                        raise shard
+                    break
+                for j in doc_orders[s]:
+                    yield shard.document(int(j))
+        finally:
+            stop.set()
+            # Unblock the producer if it is waiting on a full queue
+            while thread.is_alive():
+                try:
+                    loaded.get_nowait()
+                except queue.Empty:
+                    thread.join(0.01)
+
+    def __iter__(self):
+        return self.iter_epoch(0)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-tokenize a labeled corpus into memory-mapped shards")
+    parser.add_argument("corpus", help="JSON lines with 'text' or 'sentences' and 'labels'")
+    parser.add_argument("output_dir")
+    parser.add_argument("--preprocessor", required=True,
+                        help="pickled TextPreprocessor or model pickle containing one")
+    parser.add_argument("--docs-per-shard", type=int, default=10000)
+    args = parser.parse_args()
+
+    build_shards(args.corpus, load_preprocessor(args.preprocessor), args.output_dir, args.docs_per_shard)
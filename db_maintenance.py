@@ -0,0 +1,108 @@
+import os
+import time
+import threading
+from sqlalchemy import event, inspect, text
+
+# Schema upkeep and query auditing for the app database.
+#
+# db.create_all() creates missing tables but never touches existing ones, so
+# indexes added to models.py later would only exist on fresh databases.
+# ensure_indexes() creates any model index the database is missing. A unique
+# index that cannot be built because of duplicate rows is reported and
+# created as a plain index instead, so lookups are still indexed.
+#
+# With QUERY_AUDIT=1 (meant for development), every statement on the audited
+# tables is logged with its duration and the database's EXPLAIN plan.
+
+AUDITED_TABLES = ('users', 'activities')
+
+
+def ensure_indexes(db):
+    """Create model indexes missing from existing tables; returns the names created"""
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        # Unique constraints created with the table are indexes too
+        existing |= {uc['name'] for uc in inspector.get_unique_constraints(table.name) if uc.get('name')}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=engine)
+            except Exception as e:
+                if not index.unique:
+                    raise
+                print(f"Could not create unique index {index.name} ({e.__class__.__name__}); "
+                      f"existing rows have duplicates, creating it as non-unique")
+                columns = ', '.join(column.name for column in index.columns)
+                with engine.begin() as conn:
+                    conn.execute(text(f"CREATE INDEX {index.name} ON {table.name} ({columns})"))
+            created.append(index.name)
+            print(f"Created index {index.name} on {table.name}")
+    return created
+
+
+def _explain_prefix(dialect_name):
+    return 'EXPLAIN QUERY PLAN ' if dialect_name == 'sqlite' else 'EXPLAIN '
+
+
+def enable_query_audit(engine, tables=AUDITED_TABLES, slow_ms=0.0):
+    """Log timing and EXPLAIN output for statements that touch the given tables"""
+    prefix = _explain_prefix(engine.dialect.name)
+    local = threading.local()
+
+    def audited(statement):
+        lowered = statement.lower()
+        return lowered.lstrip().startswith(('select', 'update', 'delete')) and \
+            any(table in lowered for table in tables)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before(conn, cursor, statement, parameters, context, executemany):
+        local.start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - getattr(local, 'start', time.perf_counter())) * 1000
+        if executemany or not audited(statement) or elapsed_ms < slow_ms:
+            return
+        try:
+            # A raw DBAPI cursor keeps the EXPLAIN itself out of these events
+            explain = conn.connection.cursor()
+            explain.execute(prefix + statement, parameters)
+            plan = [' '.join(str(col) for col in row) for row in explain.fetchall()]
+            explain.close()
+        except Exception as e:
+            plan = [f"(EXPLAIN failed: {e})"]
+        print(f"[query audit] {elapsed_ms:.2f} ms: {' '.join(statement.split())}")
+        for line in plan:
+            print(f"[query audit]   {line}")
+
+
+def init_db_maintenance(app, db):
+    with app.app_context():
+        ensure_indexes(db)
+        if os.getenv('QUERY_AUDIT', '').lower() in ('1', 'true', 'yes'):
+            enable_query_audit(db.engine, slow_ms=float(os.getenv('QUERY_AUDIT_SLOW_MS', 0)))
+            print("Query audit enabled")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create missing indexes in the app database")
+    parser.parse_args()
+
+    from flask import Flask
+    from models import db
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///mydb.sqlite3')
+    db.init_app(app)
+    with app.app_context():
+        created = ensure_indexes(db)
+    print(f"{len(created)} indexes created")
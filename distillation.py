@@ -0,0 +1,171 @@
+import time
+import pickle
+import numpy as np
+
+from model_classes import FastExtractiveScorer
+from dataset_shards import ShardedDataset
+from optimizers import OPTIMIZERS, make_optimizer
+from training import document_forward, iter_batches
+
+# Distills the two-level RNN (teacher) into a FastExtractiveScorer (student).
+#
+# The student is trained on the teacher's per-sentence probabilities with a
+# soft-target binary cross-entropy, over the same pre-tokenized shards and
+# TextPreprocessor vocabulary as the teacher. Student embedding gradients
+# are row-sparse and go through the same lazy optimizers as training.py.
+
+
+class StudentGradients:
+    """Gradient container with the interface optimizers.Optimizer.step expects"""
+    embedding_name = 'embedding'
+
+    def __init__(self, student):
+        self.dense = {'W': np.zeros_like(student.W), 'b': np.zeros_like(student.b)}
+        self.embed_dim = student.embed_dim
+        self.zero()
+
+    def zero(self):
+        for grad in self.dense.values():
+            grad.fill(0)
+        self._rows = []
+        self._row_grads = []
+        self.num_sentences = 0
+
+    def add_embedding(self, rows, grads):
+        self._rows.append(rows)
+        self._row_grads.append(grads)
+
+    def embedding_gradient(self):
+        if not self._rows:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.embed_dim), dtype=np.float32)
+        rows = np.concatenate(self._rows)
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        summed = np.zeros((len(unique_rows), self.embed_dim), dtype=np.float32)
+        np.add.at(summed, inverse, np.concatenate(self._row_grads))
+        return unique_rows, summed
+
+    def scale(self, factor):
+        for grad in self.dense.values():
+            grad *= factor
+        for grads in self._row_grads:
+            grads *= factor
+
+
+def student_parameters(student):
+    return {'embedding': student.embedding, 'W': student.W, 'b': student.b}
+
+
+def accumulate_student(student, sentences, targets, grads):
+    """Soft-target cross-entropy gradients for one document; returns its loss"""
+    probabilities, (feats, rows, owners, lengths) = student.forward(sentences)
+    grad_logits = (probabilities - targets).astype(np.float32)
+    grads.dense['W'] += grad_logits @ feats
+    grads.dense['b'] += grad_logits.sum()
+
+    # Only the bag-of-embeddings part of the features reaches the embedding
+    grad_bags = np.outer(grad_logits, student.W[:student.embed_dim]) / np.maximum(lengths, 1)[:, None]
+    grads.add_embedding(rows, grad_bags[owners].astype(np.float32))
+    grads.num_sentences += len(sentences)
+
+    p = np.clip(probabilities, 1e-7, 1 - 1e-7)
+    return float(-np.sum(targets * np.log(p) + (1 - targets) * np.log(1 - p)))
+
+
+def teacher_targets(teacher, documents):
+    """Pair each document with the teacher's inference-time probabilities"""
+    for sentences, _ in documents:
+        if len(sentences) == 0:
+            continue
+        probabilities, _ = document_forward(teacher, sentences, training=False)
+        yield sentences, probabilities.astype(np.float32)
+
+
+def agreement(teacher, student, documents, top_k=3):
+    """How closely the student reproduces the teacher on held-out documents"""
+    abs_errors = []
+    teacher_all = []
+    student_all = []
+    overlaps = []
+    for sentences, teacher_probs in teacher_targets(teacher, documents):
+        student_probs, _ = student.forward(sentences)
+        abs_errors.append(np.abs(student_probs - teacher_probs))
+        teacher_all.append(teacher_probs)
+        student_all.append(student_probs)
+        k = min(top_k, len(sentences))
+        top_teacher = set(np.argsort(-teacher_probs)[:k].tolist())
+        top_student = set(np.argsort(-student_probs)[:k].tolist())
+        overlaps.append(len(top_teacher & top_student) / k)
+    if not abs_errors:
+        return {'documents': 0}
+    teacher_all = np.concatenate(teacher_all)
+    student_all = np.concatenate(student_all)
+    correlation = float(np.corrcoef(teacher_all, student_all)[0, 1]) if teacher_all.std() and student_all.std() else 0.0
+    return {
+        'documents': len(overlaps),
+        'mean_abs_error': float(np.concatenate(abs_errors).mean()),
+        'correlation': correlation,
+        f'top{top_k}_overlap': float(np.mean(overlaps)),
+    }
+
+
+def distill(teacher, dataset, student=None, epochs=3, batch_size=64, optimizer=None, holdout_every=20,
+            embed_dim=32):
+    """Train a student on the teacher's outputs; every holdout_every-th document is held out"""
+    student = student or FastExtractiveScorer(teacher.vocab_size, embed_dim)
+    optimizer = optimizer or make_optimizer('adam', learning_rate=0.01)
+    grads = StudentGradients(student)
+    params = student_parameters(student)
+
+    # Teacher outputs are computed once and reused every epoch
+    train_docs, holdout_docs = [], []
+    for i, (sentences, labels) in enumerate(dataset.iter_epoch(0)):
+        (holdout_docs if holdout_every and i % holdout_every == 0 else train_docs).append((sentences, labels))
+    train_targets = list(teacher_targets(teacher, train_docs))
+
+    rng = np.random.RandomState(0)
+    for epoch in range(epochs):
+        start = time.time()
+        total_loss, total_sentences = 0.0, 0
+        order = rng.permutation(len(train_targets))
+        for batch in iter_batches((train_targets[i] for i in order), batch_size):
+            grads.zero()
+            for sentences, targets in batch:
+                total_loss += accumulate_student(student, sentences, targets, grads)
+            total_sentences += grads.num_sentences
+            grads.scale(1.0 / max(grads.num_sentences, 1))
+            optimizer.step(params, grads)
+        print(f"Distill epoch {epoch + 1}/{epochs}: loss {total_loss / max(total_sentences, 1):.4f}, "
+              f"{time.time() - start:.1f}s")
+
+    report = agreement(teacher, student, holdout_docs)
+    print(f"Teacher agreement on {report['documents']} held-out documents: {report}")
+    return student, report
+
+
+if __name__ == "__main__":
+    import argparse
+    from LoadSummarizer import load_model_file, FAST_MODEL_FILE
+
+    parser = argparse.ArgumentParser(description="Distill the RNN summarizer into a fast student scorer")
+    parser.add_argument("data_dir", help="output of dataset_shards.py")
+    parser.add_argument("--teacher", required=True, help="trained RNN model pickle")
+    parser.add_argument("--output", default=FAST_MODEL_FILE,
+                        help="the app loads the fast tier from this name (or FAST_MODEL_PATH)")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--embed-dim", type=int, default=32)
+    parser.add_argument("--optimizer", choices=sorted(OPTIMIZERS), default="adam")
+    parser.add_argument("--learning-rate", type=float, default=0.01)
+    parser.add_argument("--holdout-every", type=int, default=20)
+    args = parser.parse_args()
+
+    teacher, preprocessor = load_model_file(args.teacher)
+    dataset = ShardedDataset(args.data_dir, shuffle=False, cache=True)
+    optimizer = make_optimizer(args.optimizer, learning_rate=args.learning_rate)
+    student, report = distill(teacher, dataset, epochs=args.epochs, batch_size=args.batch_size,
+                              optimizer=optimizer, holdout_every=args.holdout_every, embed_dim=args.embed_dim)
+
+    # {'model', 'preprocessor'} is the layout load_model() already accepts
+    with open(args.output, "wb") as f:
+        pickle.dump({'model': student, 'preprocessor': preprocessor, 'teacher_agreement': report}, f)
+    print(f"Saved student to {args.output}")
@@ -0,0 +1,257 @@
+import io
+import re
+import json
+import time
+import contextlib
+from multiprocessing import Pool
+import numpy as np
+
+# ROUGE-1/2/L scoring for extractive summaries.
+#
+# Tokens are lowercased \b\w+\b words (the TextPreprocessor.tokenize rule)
+# interned to integer ids, so n-grams become int64 keys and overlap counting
+# is a sorted-array intersection in NumPy. ROUGE-L uses the bit-parallel LCS
+# of Hyyro (2004): one big-integer add/and/or per candidate token, instead
+# of filling an m x n table. When several systems are compared, each
+# reference is tokenized once and scored against all of their summaries.
+# Only the word -> id table is kept between calls; whole texts are not cached,
+# since nearly every candidate and reference is seen once.
+
+_WORD_RE = re.compile(r'\b\w+\b')
+_vocab = {}
+
+
+def _intern(word):
+    idx = _vocab.get(word)
+    if idx is None:
+        idx = _vocab[word] = len(_vocab) + 1
+    return idx
+
+
+def token_ids(text):
+    return np.array([_intern(w) for w in _WORD_RE.findall(text.lower())], dtype=np.int64)
+
+
+def ngram_keys(ids, n):
+    """Hash each n-gram of an id array into one int64 key"""
+    if len(ids) < n:
+        return np.zeros(0, dtype=np.int64)
+    keys = ids[:len(ids) - n + 1].copy()
+    for k in range(1, n):
+        keys = keys * 1000003 + ids[k:len(ids) - n + 1 + k]
+    return keys
+
+
+def _prf(overlap, candidate_total, reference_total):
+    precision = overlap / candidate_total if candidate_total else 0.0
+    recall = overlap / reference_total if reference_total else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def rouge_n(candidate_ids, reference_ids, n):
+    cand = ngram_keys(candidate_ids, n)
+    ref = ngram_keys(reference_ids, n)
+    if len(cand) == 0 or len(ref) == 0:
+        return _prf(0, len(cand), len(ref))
+    cand_keys, cand_counts = np.unique(cand, return_counts=True)
+    ref_keys, ref_counts = np.unique(ref, return_counts=True)
+    _, ci, ri = np.intersect1d(cand_keys, ref_keys, assume_unique=True, return_indices=True)
+    overlap = int(np.minimum(cand_counts[ci], ref_counts[ri]).sum())
+    return _prf(overlap, len(cand), len(ref))
+
+
+def lcs_length(a, b):
+    """Bit-parallel LCS length of two id sequences"""
+    if len(a) == 0 or len(b) == 0:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    masks = {}
+    for i, token in enumerate(a.tolist()):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    v = full
+    for token in b.tolist():
+        u = v & masks.get(token, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(a) - bin(v).count('1')
+
+
+def rouge_l(candidate_ids, reference_ids):
+    return _prf(lcs_length(candidate_ids, reference_ids), len(candidate_ids), len(reference_ids))
+
+
+def score_pair(candidate, reference):
+    """ROUGE-1/2/L (precision, recall, f1) for one candidate/reference pair"""
+    return score_ids(token_ids(candidate), token_ids(reference))
+
+
+def score_ids(cand_ids, ref_ids):
+    """score_pair() for already tokenized texts"""
+    return {
+        'rouge1': rouge_n(cand_ids, ref_ids, 1),
+        'rouge2': rouge_n(cand_ids, ref_ids, 2),
+        'rougeL': rouge_l(cand_ids, ref_ids),
+    }
+
+
+METRICS = ('rouge1', 'rouge2', 'rougeL')
+
+
+def _score_chunk(pairs):
+    totals = np.zeros((len(METRICS), 3))
+    for candidate, reference in pairs:
+        scores = score_pair(candidate, reference)
+        totals += [scores[m] for m in METRICS]
+    return totals, len(pairs)
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _aggregate(results):
+    totals = np.zeros((len(METRICS), 3))
+    count = 0
+    for chunk_totals, chunk_count in results:
+        totals += chunk_totals
+        count += chunk_count
+    means = totals / max(count, 1)
+    report = {m: dict(zip(('precision', 'recall', 'f1'), means[i].tolist())) for i, m in enumerate(METRICS)}
+    report['count'] = count
+    return report
+
+
+def score_corpus(pairs, workers=None, chunk_size=256):
+    """Mean ROUGE over an iterable of (candidate, reference) pairs"""
+    if workers == 1:
+        return _aggregate(_score_chunk(chunk) for chunk in chunked(pairs, chunk_size))
+    with Pool(workers) as pool:
+        return _aggregate(pool.imap_unordered(_score_chunk, chunked(pairs, chunk_size)))
+
+
+# ---------------------------------------------------------------------------
+# Comparing model files / inference modes on a corpus
+
+def lead_summary(model, text, preprocessor, max_sentences):
+    """The first max_sentences sentences, as app.py's fallback does"""
+    from model_classes import split_into_sentences
+    sentences = split_into_sentences(text)
+    return '. '.join(sentences[:max_sentences]) + '.' if sentences else text
+
+
+def model_summary(model, text, preprocessor, max_sentences):
+    from LoadSummarizer import generate_summary
+    return generate_summary(model, text, preprocessor, max_sentences)
+
+
+SUMMARIZERS = {
+    'model': model_summary,
+    'lead': lead_summary,
+}
+
+_systems = None
+
+
+def _init_systems(specs):
+    global _systems
+    from LoadSummarizer import load_model_file
+    _systems = []
+    for model_path, mode in specs:
+        model, preprocessor = load_model_file(model_path) if model_path else (None, None)
+        _systems.append((model, preprocessor, SUMMARIZERS[mode]))
+
+
+def _summarize_and_score(args):
+    records, max_sentences = args
+    totals = [np.zeros((len(METRICS), 3)) for _ in _systems]
+    elapsed = [0.0 for _ in _systems]
+    # generate_summary logs every step to stdout; keep that out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for text, reference in records:
+            ref_ids = token_ids(reference)
+            for i, (model, preprocessor, summarize) in enumerate(_systems):
+                start = time.time()
+                summary = summarize(model, text, preprocessor, max_sentences)
+                elapsed[i] += time.time() - start
+                scores = score_ids(token_ids(summary), ref_ids)
+                totals[i] += [scores[m] for m in METRICS]
+    return totals, elapsed, len(records)
+
+
+def iter_corpus(path, limit=None):
+    with open(path, 'r', encoding='utf-8') as f:
+        count = 0
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            text = record.get('text') or record.get('article', '')
+            reference = record.get('summary') or record.get('abstract', '')
+            yield text, reference
+            count += 1
+            if limit and count >= limit:
+                return
+
+
+def compare_systems(corpus_path, specs, max_sentences=3, workers=None, chunk_size=64, limit=None):
+    """Score several (model_path, mode) systems on the same corpus"""
+    tasks = ((chunk, max_sentences) for chunk in chunked(iter_corpus(corpus_path, limit), chunk_size))
+    totals = [np.zeros((len(METRICS), 3)) for _ in specs]
+    elapsed = [0.0 for _ in specs]
+    count = 0
+    with Pool(workers, initializer=_init_systems, initargs=(specs,)) as pool:
+        for chunk_totals, chunk_elapsed, chunk_count in pool.imap_unordered(_summarize_and_score, tasks):
+            for i in range(len(specs)):
+                totals[i] += chunk_totals[i]
+                elapsed[i] += chunk_elapsed[i]
+            count += chunk_count
+    reports = []
+    for i in range(len(specs)):
+        report = _aggregate([(totals[i], count)])
+        report['summarize_seconds'] = elapsed[i]
+        reports.append(report)
+    return reports
+
+
+def format_report(name, report):
+    parts = [f"{m} P/R/F {report[m]['precision']:.4f}/{report[m]['recall']:.4f}/{report[m]['f1']:.4f}"
+             for m in METRICS]
+    return f"{name}: " + ", ".join(parts)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare two summarizers with ROUGE on a JSONL corpus")
+    parser.add_argument("corpus", help="JSON lines with 'text'/'article' and 'summary'/'abstract'")
+    parser.add_argument("--model-a", help="model pickle for system A")
+    parser.add_argument("--model-b", help="model pickle for system B (defaults to --model-a)")
+    parser.add_argument("--mode-a", choices=sorted(SUMMARIZERS), default="model")
+    parser.add_argument("--mode-b", choices=sorted(SUMMARIZERS), default="lead")
+    parser.add_argument("--max-sentences", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    if args.mode_a == 'model' and not args.model_a:
+        parser.error("--model-a is required when --mode-a is 'model'")
+    if args.mode_b == 'model' and not (args.model_b or args.model_a):
+        parser.error("--model-a or --model-b is required when --mode-b is 'model'")
+
+    specs = [(args.model_a, args.mode_a), (args.model_b or args.model_a, args.mode_b)]
+    start = time.time()
+    report_a, report_b = compare_systems(args.corpus, specs, args.max_sentences, args.workers, limit=args.limit)
+    print(f"Scored {report_a['count']} documents in {time.time() - start:.1f}s")
+    print(format_report(f"A ({args.mode_a}, {specs[0][0]})", report_a))
+    print(format_report(f"B ({args.mode_b}, {specs[1][0]})", report_b))
+    for m in METRICS:
+        print(f"  delta {m} F1 (B - A): {report_b[m]['f1'] - report_a[m]['f1']:+.4f}")
@@ -0,0 +1,236 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from model_classes import split_into_sentences
+
+# Incremental re-summarization for documents that are edited and resubmitted.
+#
+# A session remembers, per document ID, the last text, its sentences, each
+# sentence's word-RNN encoding and the document-RNN hidden state after every
+# sentence. On an edit:
+#   - sentence encodings are reused for every sentence whose token indices
+#     are unchanged (the word RNN sees one sentence at a time, so an encoding
+#     only depends on that sentence)
+#   - document-RNN states are reused up to the first changed sentence, and
+#     the recurrence is rerun only from there
+# Sessions are evicted after ttl seconds without use, and the least recently
+# used session is dropped when max_sessions is reached. Each session has its
+# own lock, held from the version check until the update is stored, so two
+# concurrent edits of one document are applied one after the other.
+
+
+class VersionConflict(Exception):
+    """The edit was made against a version the server no longer has"""
+
+
+class Session:
+    def __init__(self, doc_id):
+        self.doc_id = doc_id
+        self.version = 0
+        self.text = ''
+        self.indices = []
+        self.sentences = []
+        self.encodings = []
+        self.doc_states = []
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+
+
+class SessionStore:
+    def __init__(self, max_sessions=1000, ttl=1800):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now):
+        while self._sessions:
+            doc_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.ttl:
+                break
+            del self._sessions[doc_id]
+
+    def get(self, doc_id):
+        with self._lock:
+            now = time.time()
+            self._evict_expired(now)
+            session = self._sessions.get(doc_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(doc_id)
+            return session
+
+    def create(self, doc_id=None):
+        with self._lock:
+            now = time.time()
+            self._evict_expired(now)
+            session = Session(doc_id or uuid.uuid4().hex)
+            self._sessions[session.doc_id] = session
+            self._sessions.move_to_end(session.doc_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def checked_edits(edits):
+    """edits as a list of {'start', 'end', 'text'} dicts sorted by start; ValueError if malformed or overlapping"""
+    if not isinstance(edits, list):
+        raise ValueError("edits must be a list")
+    checked = []
+    for edit in edits:
+        if not isinstance(edit, dict):
+            raise ValueError("Each edit must be an object with start, end and text")
+        start, end, text = edit.get('start'), edit.get('end'), edit.get('text', '')
+        if type(start) is not int or type(end) is not int:
+            raise ValueError("Edit start and end must be integers")
+        if not isinstance(text, str):
+            raise ValueError("Edit text must be a string")
+        if not 0 <= start <= end:
+            raise ValueError(f"Edit range {start}:{end} is invalid")
+        checked.append({'start': start, 'end': end, 'text': text})
+    checked.sort(key=lambda e: e['start'])
+    for previous, edit in zip(checked, checked[1:]):
+        if edit['start'] < previous['end']:
+            raise ValueError(f"Edit ranges {previous['start']}:{previous['end']} and "
+                             f"{edit['start']}:{edit['end']} overlap")
+    return checked
+
+
+def apply_edits(text, edits):
+    """Apply [{'start', 'end', 'text'}] character-range replacements to text.
+
+    Ranges refer to the original text, in any order; overlapping or
+    out-of-range edits raise ValueError.
+    """
+    edits = checked_edits(edits)
+    if edits and edits[-1]['end'] > len(text):
+        raise ValueError(f"Edit range {edits[-1]['start']}:{edits[-1]['end']} outside document "
+                         f"of length {len(text)}")
+    result = text
+    for edit in reversed(edits):
+        result = result[:edit['start']] + edit['text'] + result[edit['end']:]
+    return result
+
+
+def prepare_sentences(text, preprocessor):
+    """Sentences and token indices as generate_summary() filters them"""
+    sentences = split_into_sentences(text)
+    pairs = [(s, preprocessor.text_to_indices(s)) for s in sentences]
+    pairs = [(s, idx) for s, idx in pairs if len(idx) > 2]
+    return [s for s, _ in pairs], [idx for _, idx in pairs]
+
+
+def supports_incremental(model):
+    return hasattr(model, 'word_encoder') and hasattr(model, 'sentence_encoder') and hasattr(model, 'classifier')
+
+
+def update_session(model, session, text, preprocessor):
+    """Rescore session for new text, reusing cached work; returns (probabilities, stats)"""
+    sentences, indices = prepare_sentences(text, preprocessor)
+    if not supports_incremental(model):
+        # e.g. FastExtractiveScorer: no recurrent state to reuse
+        probabilities = model.forward(indices, training=False)[0] if indices else np.array([])
+        session.text, session.sentences, session.indices = text, sentences, indices
+        session.version += 1
+        return probabilities, {'sentences': len(indices), 'encodings_reused': 0, 'states_reused': 0,
+                               'states_recomputed': len(indices)}
+
+    # Reuse word-RNN encodings by sentence content
+    cached = {}
+    for old_indices, encoding in zip(session.indices, session.encodings):
+        cached[tuple(old_indices)] = encoding
+    encodings = []
+    reused = 0
+    for idx in indices:
+        encoding = cached.get(tuple(idx))
+        if encoding is None:
+            encoding = model.word_encoder.forward(idx, training=False)[0]
+        else:
+            reused += 1
+        encodings.append(encoding)
+
+    # Document-RNN states are valid up to the first changed sentence
+    prefix = 0
+    while (prefix < len(indices) and prefix < len(session.indices)
+           and indices[prefix] == session.indices[prefix]):
+        prefix += 1
+    doc_states = session.doc_states[:prefix]
+    se = model.sentence_encoder
+    h = doc_states[-1] if doc_states else np.zeros(model.word_encoder.hidden_dim, dtype=np.float32)
+    for rep in encodings[prefix:]:
+        h = np.clip(np.tanh(se.W_ih_sent @ rep + se.W_hh_sent @ h + se.b_h_sent), -5, 5)
+        doc_states.append(h)
+
+    probabilities = model.classifier.forward(doc_states) if doc_states else np.array([])
+
+    session.text = text
+    session.sentences = sentences
+    session.indices = indices
+    session.encodings = encodings
+    session.doc_states = doc_states
+    session.version += 1
+    stats = {
+        'sentences': len(indices),
+        'encodings_reused': reused,
+        'states_reused': prefix,
+        'states_recomputed': len(indices) - prefix,
+    }
+    return probabilities, stats
+
+
+def checked_int(value, name, minimum):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+    if value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return value
+
+
+def resummarize(store, model, preprocessor, doc_id=None, text=None, edits=None, version=None,
+                max_sentences=None):
+    """Summarize a new or edited document.
+
+    Malformed arguments raise ValueError; KeyError means doc_id has no session.
+    Returns (summary, document, stats), where document holds the doc_id, version
+    and text length as of this update.
+    """
+    from LoadSummarizer import summary_from_probabilities, calculate_dynamic_summary_length
+
+    if max_sentences is not None:
+        max_sentences = checked_int(max_sentences, 'max_sentences', 1)
+    if version is not None:
+        version = checked_int(version, 'version', 0)
+    if text is not None and not isinstance(text, str):
+        raise ValueError("text must be a string")
+    if text is None:
+        edits = checked_edits(edits or [])
+
+    session = store.get(doc_id) if doc_id else None
+    if text is None and session is None:
+        raise KeyError(doc_id)
+    if session is None:
+        session = store.create(doc_id)
+
+    with session.lock:
+        if text is None:
+            if version is not None and version != session.version:
+                raise VersionConflict(f"Document is at version {session.version}, edit was for {version}")
+            text = apply_edits(session.text, edits or [])
+
+        probabilities, stats = update_session(model, session, text, preprocessor)
+        if max_sentences is None:
+            max_sentences = calculate_dynamic_summary_length(text)
+        if not session.sentences:
+            summary = text[:200] + "..." if len(text) > 200 else text
+        else:
+            summary = summary_from_probabilities(probabilities, session.sentences, max_sentences)
+        document = {'doc_id': session.doc_id, 'version': session.version, 'length': len(session.text)}
+    return summary, document, stats
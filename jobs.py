@@ -0,0 +1,304 @@
+# jobs.py
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+import traceback
+from functools import wraps
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from models import db, SummaryJob
+from incremental import checked_int
+
+# Asynchronous summarization jobs.
+#
+# Jobs are rows in the summary_jobs table of the app's own database, so the
+# queue survives restarts and any process using the same DATABASE_URL can
+# work on it. A worker claims the oldest queued job with a conditional
+# UPDATE (status='queued' -> 'running'); if another worker got there first
+# the update matches no row and it moves on. Running jobs refresh
+# heartbeat_at, and jobs whose heartbeat is older than stale_after seconds
+# (their worker died) are put back in the queue. Finished jobs are kept for
+# result_ttl seconds and then deleted.
+#
+# Submissions go through the app's admission control (set_job_admission), so
+# the per-identity rate limit cannot be sidestepped by queueing jobs instead
+# of calling /summarize.
+
+jobs = Blueprint("jobs", __name__)
+
+FINISHED = ('succeeded', 'failed', 'cancelled')
+TIERS = ('trained', 'fast')
+MAX_JOB_CHARS = int(os.getenv('MAX_JOB_CHARS', 5 * 1024 * 1024))
+RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 3600))
+
+_summarizer = None
+_admission_limit = None
+
+
+def set_job_summarizer(summarizer):
+    """Set the function jobs run: summarizer(text, options, should_cancel) -> result dict"""
+    global _summarizer
+    _summarizer = summarizer
+
+
+def set_job_admission(controller, cost_fn):
+    """Admit job submissions through this AdmissionController, charged cost_fn()"""
+    global _admission_limit
+    _admission_limit = controller.limit(cost_fn)
+
+
+def admitted(view):
+    """Apply the admission limit set with set_job_admission, if any"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if _admission_limit is None:
+            return view(*args, **kwargs)
+        return _admission_limit(view)(*args, **kwargs)
+    return wrapper
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job_to_dict(job, include_result=True):
+    data = {
+        "id": job.id,
+        "status": job.status,
+        "cancel_requested": job.cancel_requested,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "expires_at": job.expires_at.isoformat() if job.expires_at else None,
+    }
+    if include_result and job.result:
+        data["result"] = json.loads(job.result)
+    if job.error:
+        data["error"] = job.error
+    return data
+
+
+def job_options(data):
+    """The options a job stores, checked now so a bad value fails the request, not the job"""
+    options = {}
+    if data.get("max_sentences") is not None:
+        options["max_sentences"] = checked_int(data["max_sentences"], "max_sentences", 1)
+    if data.get("tier") is not None:
+        if data["tier"] not in TIERS:
+            raise ValueError(f"tier must be one of: {', '.join(TIERS)}")
+        options["tier"] = data["tier"]
+    return options
+
+
+def enqueue_job(text, options=None):
+    job = SummaryJob(id=uuid.uuid4().hex, status='queued', text=text, options=json.dumps(options or {}))
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def claim_next_job(worker_id):
+    """Atomically move the oldest queued job to running; returns it or None"""
+    while True:
+        job_id = db.session.query(SummaryJob.id).filter_by(status='queued') \
+            .order_by(SummaryJob.created_at).limit(1).scalar()
+        if job_id is None:
+            return None
+        now = datetime.utcnow()
+        claimed = SummaryJob.query.filter_by(id=job_id, status='queued').update(
+            {"status": 'running', "worker": worker_id, "started_at": now, "heartbeat_at": now},
+            synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(SummaryJob, job_id)
+
+
+def finish_job(job_id, status, result_ttl, result=None, error=None):
+    now = datetime.utcnow()
+    SummaryJob.query.filter_by(id=job_id).update({
+        "status": status,
+        "result": json.dumps(result) if result is not None else None,
+        "error": error,
+        "finished_at": now,
+        "expires_at": now + timedelta(seconds=result_ttl),
+        "text": '',  # the input is not needed once the job is done
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def requeue_stale_jobs(stale_after):
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    count = SummaryJob.query.filter(SummaryJob.status == 'running', SummaryJob.heartbeat_at < cutoff).update(
+        {"status": 'queued', "worker": None}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def purge_expired_jobs():
+    count = SummaryJob.query.filter(SummaryJob.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+class JobWorkerPool:
+    """Threads that run queued jobs inside the given Flask app's context"""
+
+    def __init__(self, app, workers=1, poll_interval=0.5, result_ttl=RESULT_TTL, stale_after=300,
+                 heartbeat_every=5.0):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self.stale_after = stale_after
+        self.heartbeat_every = heartbeat_every
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            worker_id = f"{socket.gethostname()}:{os.getpid()}:{i}"
+            thread = threading.Thread(target=self._run, args=(worker_id,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self, worker_id):
+        with self.app.app_context():
+            last_maintenance = 0.0
+            while not self._stop.is_set():
+                try:
+                    if time.time() - last_maintenance > self.stale_after / 2:
+                        requeue_stale_jobs(self.stale_after)
+                        purge_expired_jobs()
+                        last_maintenance = time.time()
+                    job = claim_next_job(worker_id)
+                    if job is None:
+                        db.session.remove()
+                        self._stop.wait(self.poll_interval)
+                        continue
+                    self._execute(job)
+                except Exception:
+                    db.session.rollback()
+                    print(f"Job worker {worker_id} error:", traceback.format_exc())
+                    self._stop.wait(self.poll_interval)
+
+    def _execute(self, job):
+        job_id, text, options = job.id, job.text, json.loads(job.options or '{}')
+        last_check = [time.time()]
+
+        def should_cancel():
+            # Called between sentences; only touches the database every heartbeat_every seconds
+            if time.time() - last_check[0] < self.heartbeat_every:
+                return False
+            last_check[0] = time.time()
+            SummaryJob.query.filter_by(id=job_id).update({"heartbeat_at": datetime.utcnow()},
+                                                         synchronize_session=False)
+            db.session.commit()
+            return bool(db.session.query(SummaryJob.cancel_requested).filter_by(id=job_id).scalar())
+
+        try:
+            if _summarizer is None:
+                raise RuntimeError("No job summarizer configured")
+            result = _summarizer(text, options, should_cancel)
+            finish_job(job_id, 'succeeded', self.result_ttl, result=result)
+        except JobCancelled:
+            db.session.rollback()
+            finish_job(job_id, 'cancelled', self.result_ttl)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Job {job_id} failed:", traceback.format_exc())
+            finish_job(job_id, 'failed', self.result_ttl, error=str(e))
+
+
+@jobs.route('/summarize', methods=['POST'])
+@admitted
+def submit_summarize_job():
+    """Queue a summarization job; returns its ID immediately"""
+    try:
+        if not request.is_json:
+            return jsonify({"error": "Content-Type must be application/json"}), 400
+
+        data = request.get_json()
+        if not isinstance(data, dict) or not isinstance(data.get("text"), str):
+            return jsonify({"error": "No text provided"}), 400
+        text = data["text"].strip()
+        if not text:
+            return jsonify({"error": "No text provided"}), 400
+        if len(text) > MAX_JOB_CHARS:
+            return jsonify({"error": f"Text exceeds {MAX_JOB_CHARS} characters"}), 413
+
+        try:
+            options = job_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        job = enqueue_job(text, options)
+        response = jsonify(job_to_dict(job))
+        response.headers['Location'] = f"{request.script_root}/jobs/{job.id}"
+        return response, 202
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Job submit error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": "Failed to queue job"}), 500
+
+@jobs.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = db.session.get(SummaryJob, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_to_dict(job))
+
+@jobs.route('/<job_id>', methods=['DELETE'])
+@jobs.route('/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a job: queued jobs stop immediately, running jobs at their next check"""
+    try:
+        job = db.session.get(SummaryJob, job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        if job.status in FINISHED:
+            return jsonify(job_to_dict(job)), 409
+
+        cancelled = SummaryJob.query.filter_by(id=job_id, status='queued').update(
+            {"status": 'cancelled', "cancel_requested": True, "finished_at": datetime.utcnow(),
+             "expires_at": datetime.utcnow() + timedelta(seconds=RESULT_TTL),
+             "text": ''},
+            synchronize_session=False)
+        if not cancelled:
+            SummaryJob.query.filter_by(id=job_id).update({"cancel_requested": True}, synchronize_session=False)
+        db.session.commit()
+        db.session.refresh(job)
+        return jsonify(job_to_dict(job)), 202
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Job cancel error: {str(e)}")
+        return jsonify({"error": "Failed to cancel job"}), 500
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run summarization job workers against the app database")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    os.environ['JOB_WORKERS'] = '0'  # don't also start the in-process pool
+    from app import app
+    pool = JobWorkerPool(app, args.workers, args.poll_interval).start()
+    print(f"Running {args.workers} job workers; Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pool.stop()
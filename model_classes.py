@@ -7,6 +7,8 @@ from collections import defaultdict, Counter
 import re
 import copy
 from math import log, sqrt
+from itertools import islice
+from segmenter import iter_sentence_spans
 
 class ImprovedRNNEncoder:
     def __init__(self, vocab_size, embed_dim, hidden_dim, dropout=0.1):
@@ -81,10 +83,12 @@ class ImprovedRNNEncoder:
             if t > 0:
                 grad_h = np.clip(self.W_hh.T @ grad_h_raw, -0.5, 0.5)
 
-        self.embedding = np.clip(self.embedding, -5, 5)  # Was -2, 2
-        self.W_ih = np.clip(self.W_ih, -2, 2)  # Was -1, 1
-        self.W_hh = np.clip(self.W_hh, -2, 2)  # Was -1, 1
-        self.b_h = np.clip(self.b_h, -2, 2)  # Was -1, 1
+        # Clip in place and only the rows this call touched, instead of copying the whole table
+        touched = np.unique([min(max(idx, 0), self.vocab_size-1) for idx in sequence[:min(seq_len, 20)]])
+        self.embedding[touched] = np.clip(self.embedding[touched], -5, 5)  # Was -2, 2
+        np.clip(self.W_ih, -2, 2, out=self.W_ih)  # Was -1, 1
+        np.clip(self.W_hh, -2, 2, out=self.W_hh)  # Was -1, 1
+        np.clip(self.b_h, -2, 2, out=self.b_h)  # Was -1, 1
 
 
 class ImprovedSentenceEncoder:
@@ -228,10 +232,74 @@ class ImprovedExtractiveRNNSummarizer:
         probabilities = self.classifier.forward(sentence_reps)
         return probabilities, (sentence_reps, forward_data)
 
+    def iter_scores(self, sentences):
+        """Inference-only forward that yields (index, probability) per sentence.
+
+        The document RNN runs left to right, so a sentence's probability is
+        final as soon as it has been reached; nothing later changes it.
+        """
+        h_doc = np.zeros(self.word_encoder.hidden_dim, dtype=np.float32)
+        se = self.sentence_encoder
+        for i, sentence in enumerate(sentences):
+            sent_rep = self.word_encoder.forward(sentence, training=False)[0]
+            h_doc = np.tanh(se.W_ih_sent @ sent_rep + se.W_hh_sent @ h_doc + se.b_h_sent)
+            h_doc = np.clip(h_doc, -5, 5)
+            yield i, float(self.classifier.forward([h_doc])[0])
+
     def backward(self, loss_gradients, forward_data, learning_rate=0.001):
         sentence_reps, sentence_forward_data = forward_data
         grad_sentence_reps = self.classifier.backward(loss_gradients, sentence_reps, learning_rate)
         self.sentence_encoder.backward(grad_sentence_reps, sentence_forward_data, learning_rate)
+class FastExtractiveScorer:
+    """Cheap student scorer distilled from ImprovedExtractiveRNNSummarizer.
+
+    A sentence is the mean of its word embeddings plus a few position
+    features, fed to a logistic layer. forward() has the same signature as
+    the RNN summarizer, so generate_summary() can use either model.
+    """
+    NUM_POSITION_FEATURES = 5
+
+    def __init__(self, vocab_size, embed_dim=32):
+        self.vocab_size = vocab_size
+        self.embed_dim = embed_dim
+        self.hidden_dim = 0
+
+        self.embedding = np.random.normal(0, 0.1, (vocab_size, embed_dim)).astype(np.float32)
+        self.W = np.zeros(embed_dim + self.NUM_POSITION_FEATURES, dtype=np.float32)
+        self.b = np.zeros(1, dtype=np.float32)
+
+    def features(self, sentences):
+        """(num_sentences, embed_dim + 5) features and the flat token rows used"""
+        n = len(sentences)
+        lengths = np.array([len(s) for s in sentences], dtype=np.int64)
+        rows = np.concatenate([np.asarray(s, dtype=np.int64) for s in sentences]) if lengths.sum() else \
+            np.zeros(0, dtype=np.int64)
+        rows = np.clip(rows, 0, self.vocab_size - 1)
+        owners = np.repeat(np.arange(n), lengths)
+
+        bags = np.zeros((n, self.embed_dim), dtype=np.float32)
+        np.add.at(bags, owners, self.embedding[rows])
+        bags /= np.maximum(lengths, 1)[:, None]
+
+        position = np.arange(n, dtype=np.float32)
+        extra = np.stack([
+            position / max(n - 1, 1),
+            (position == 0).astype(np.float32),
+            (position == n - 1).astype(np.float32),
+            np.minimum(lengths, 30).astype(np.float32) / 30.0,
+            np.full(n, min(n, 10) / 10.0, dtype=np.float32),
+        ], axis=1)
+        return np.concatenate([bags, extra], axis=1), rows, owners, lengths
+
+    def forward(self, sentences, training=False):
+        if len(sentences) == 0:
+            return np.array([]), None
+        feats, rows, owners, lengths = self.features(sentences)
+        logits = np.clip(feats @ self.W + self.b[0], -10, 10)
+        probabilities = 1.0 / (1.0 + np.exp(-logits))
+        return probabilities, (feats, rows, owners, lengths)
+
+
 class TextPreprocessor:
     def __init__(self, vocab_size=5000):  # Reduced vocab size
         self.vocab_size = vocab_size
@@ -245,6 +313,11 @@ class TextPreprocessor:
             words = self.tokenize(text)
             self.word_counts.update(words)
 
+        return self.build_vocabulary_from_counts(self.word_counts)
+
+    def build_vocabulary_from_counts(self, word_counts):
+        """Assign indices from precomputed word counts (see vocab_builder.py)"""
+        self.word_counts = word_counts
         most_common = self.word_counts.most_common(self.vocab_size - 4)
 
         self.word_to_idx = {'<PAD>': 0, '<UNK>': 1, '<START>': 2, '<END>': 3}
@@ -270,20 +343,8 @@ class TextPreprocessor:
         return ' '.join(words)
 
 def split_into_sentences(text, max_length=30):  # Reduced max length
-    sentences = re.split(r'[.!?]+', text)
-    processed = []
-    for sent in sentences:
-        sent = sent.strip()
-        if len(sent) > 0:
-            words = sent.split()
-            if len(words) > max_length:
-                for i in range(0, len(words), max_length):
-                    chunk = ' '.join(words[i:i + max_length])
-                    if chunk.strip():
-                        processed.append(chunk.strip())
-            elif len(words) >= 3:  # Only keep sentences with at least 3 words
-                processed.append(sent)
-    return processed[:10]  # Limit to max 10 sentences per document
+    spans = islice(iter_sentence_spans(text, max_length), 10)  # Limit to max 10 sentences; stops scanning there
+    return [text[start:end] for start, end in spans]
 
 
 
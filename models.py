@@ -7,7 +7,7 @@ class User(db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), nullable=False)
+    username = db.Column(db.String(80), unique=True, index=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -17,6 +17,8 @@ class User(db.Model):
 
 class Activity(db.Model):
     __tablename__ = 'activities'
+    # Per-user listings filter on user_id and order by date; also serves plain user_id lookups
+    __table_args__ = (db.Index('ix_activities_user_id_date', 'user_id', 'date'),)
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -29,3 +31,70 @@ class Activity(db.Model):
     
     def __repr__(self):
         return f'<Activity {self.title}>'
+
+class ActivityStats(db.Model):
+    """Per-user activity counts, kept up to date by dashboard.py"""
+    __tablename__ = 'activity_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ActivityDailyStats(db.Model):
+    """Per-user, per-due-day activity counts, kept up to date by dashboard.py"""
+    __tablename__ = 'activity_daily_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+
+class SummaryInput(db.Model):
+    """Text submitted for summarization, stored once however many users send it"""
+    __tablename__ = 'summary_inputs'
+    
+    hash = db.Column(db.String(64), primary_key=True)  # sha256 of the text
+    text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Summary(db.Model):
+    """A summary produced for a user (user_id is NULL for anonymous requests)"""
+    __tablename__ = 'summaries'
+    __table_args__ = (
+        # Reuse lookups for /summarize
+        db.Index('ix_summaries_input_version', 'input_hash', 'model_version'),
+        # Per-user history, newest first
+        db.Index('ix_summaries_user_created', 'user_id', 'created_at', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    input_hash = db.Column(db.String(64), db.ForeignKey('summary_inputs.hash'), nullable=False)
+    params = db.Column(db.String(255), nullable=False)  # canonical JSON of the options used
+    model_version = db.Column(db.String(64), nullable=False)
+    summary = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    input = db.relationship('SummaryInput')
+
+class SummaryJob(db.Model):
+    __tablename__ = 'summary_jobs'
+    __table_args__ = (db.Index('ix_summary_jobs_status_created', 'status', 'created_at'),)
+    
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued/running/succeeded/failed/cancelled
+    text = db.Column(db.Text, nullable=False)
+    options = db.Column(db.Text, nullable=False, default='{}')
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    worker = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, index=True)
+    
+    def __repr__(self):
+        return f'<SummaryJob {self.id} {self.status}>'
@@ -0,0 +1,151 @@
+import numpy as np
+
+# Optimizers for training.TrainingEngine.
+#
+# Each optimizer updates the dense parameters from GradientBuffers.dense and
+# the embedding table from GradientBuffers.embedding_gradient(). Embedding
+# updates are lazy: per-row state (velocity, moments, accumulators) is only
+# read and written for rows that occurred in the batch, so a step costs
+# O(rows touched) instead of O(vocab_size).
+#
+# state_dict()/load_state_dict() round-trip hyperparameters, the step count
+# and every slot array, so optimizer state can be stored in checkpoints.
+
+
+class Optimizer:
+    def __init__(self, learning_rate=0.01):
+        self.learning_rate = learning_rate
+        self.step_count = 0
+        self.slots = {}
+
+    def hyperparameters(self):
+        return {'learning_rate': self.learning_rate}
+
+    def _slot(self, slot, name, param):
+        key = (slot, name)
+        if key not in self.slots:
+            self.slots[key] = np.zeros_like(param)
+        return self.slots[key]
+
+    def step(self, params, buffers):
+        """Apply one update from buffers to the live parameter arrays"""
+        self.step_count += 1
+        for name, grad in buffers.dense.items():
+            self.update(name, params[name], grad, slice(None))
+        rows, row_grads = buffers.embedding_gradient()
+        if len(rows):
+            name = buffers.embedding_name
+            self.update(name, params[name], row_grads, rows)
+
+    def update(self, name, param, grad, index):
+        """Update param[index] given grad for those entries"""
+        raise NotImplementedError
+
+    def state_dict(self):
+        return {
+            'type': type(self).__name__,
+            'hyperparameters': self.hyperparameters(),
+            'step_count': self.step_count,
+            'slots': {f"{slot}:{name}": array.copy() for (slot, name), array in self.slots.items()},
+        }
+
+    def load_state_dict(self, state):
+        for key, value in state['hyperparameters'].items():
+            setattr(self, key, value)
+        self.step_count = state['step_count']
+        self.slots = {}
+        for key, array in state['slots'].items():
+            slot, name = key.split(':', 1)
+            self.slots[(slot, name)] = np.array(array)
+
+
+class SGD(Optimizer):
+    def update(self, name, param, grad, index):
+        param[index] -= self.learning_rate * grad
+
+
+class Momentum(Optimizer):
+    def __init__(self, learning_rate=0.01, momentum=0.9, nesterov=False):
+        super().__init__(learning_rate)
+        self.momentum = momentum
+        self.nesterov = nesterov
+
+    def hyperparameters(self):
+        return {'learning_rate': self.learning_rate, 'momentum': self.momentum, 'nesterov': self.nesterov}
+
+    def update(self, name, param, grad, index):
+        velocity = self._slot('velocity', name, param)
+        v = self.momentum * velocity[index] + grad
+        velocity[index] = v
+        if self.nesterov:
+            v = grad + self.momentum * v
+        param[index] -= self.learning_rate * v
+
+
+class Adagrad(Optimizer):
+    def __init__(self, learning_rate=0.05, initial_accumulator=0.1, epsilon=1e-8):
+        super().__init__(learning_rate)
+        self.initial_accumulator = initial_accumulator
+        self.epsilon = epsilon
+
+    def hyperparameters(self):
+        return {'learning_rate': self.learning_rate, 'initial_accumulator': self.initial_accumulator,
+                'epsilon': self.epsilon}
+
+    def _slot(self, slot, name, param):
+        key = (slot, name)
+        if key not in self.slots:
+            self.slots[key] = np.full_like(param, self.initial_accumulator)
+        return self.slots[key]
+
+    def update(self, name, param, grad, index):
+        accumulator = self._slot('accumulator', name, param)
+        acc = accumulator[index] + grad * grad
+        accumulator[index] = acc
+        param[index] -= self.learning_rate * grad / (np.sqrt(acc) + self.epsilon)
+
+
+class Adam(Optimizer):
+    """Adam; embedding rows use lazy moments with the global bias correction"""
+
+    def __init__(self, learning_rate=0.001, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        super().__init__(learning_rate)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+
+    def hyperparameters(self):
+        return {'learning_rate': self.learning_rate, 'beta1': self.beta1, 'beta2': self.beta2,
+                'epsilon': self.epsilon}
+
+    def update(self, name, param, grad, index):
+        m_slot = self._slot('m', name, param)
+        v_slot = self._slot('v', name, param)
+        m = self.beta1 * m_slot[index] + (1 - self.beta1) * grad
+        v = self.beta2 * v_slot[index] + (1 - self.beta2) * grad * grad
+        m_slot[index] = m
+        v_slot[index] = v
+        step_size = self.learning_rate * np.sqrt(1 - self.beta2 ** self.step_count) / (1 - self.beta1 ** self.step_count)
+        param[index] -= step_size * m / (np.sqrt(v) + self.epsilon)
+
+
+OPTIMIZERS = {
+    'sgd': SGD,
+    'momentum': Momentum,
+    'adagrad': Adagrad,
+    'adam': Adam,
+}
+
+
+def make_optimizer(name, **kwargs):
+    try:
+        return OPTIMIZERS[name.lower()](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown optimizer '{name}', expected one of {sorted(OPTIMIZERS)}")
+
+
+def optimizer_from_state(state):
+    """Rebuild an optimizer from state_dict() output"""
+    optimizer = {cls.__name__: cls for cls in OPTIMIZERS.values()}[state['type']]()
+    optimizer.load_state_dict(state)
+    return optimizer
@@ -0,0 +1,160 @@
+import json
+import time
+from multiprocessing import Pool
+import numpy as np
+
+from model_classes import split_into_sentences
+from evaluation import token_ids, ngram_keys, iter_corpus, chunked
+from dataset_shards import ShardWriter, load_preprocessor
+
+# Greedy ROUGE-oracle sentence labels for extractive training data.
+#
+# For each (article, abstract) pair the article is split with
+# split_into_sentences (the same split dataset_shards.py applies to 'text'),
+# and sentences are added greedily while they improve the mean of ROUGE-1 and
+# ROUGE-2 F1 against the abstract. Selected sentences are labeled 1.
+#
+# Each candidate's gain is computed incrementally: the overlap of the current
+# selection is kept per reference n-gram, so scoring a candidate only walks
+# that sentence's own n-grams instead of re-scoring the whole union.
+
+
+class _NgramState:
+    def __init__(self, reference_ids, n):
+        keys, counts = np.unique(ngram_keys(reference_ids, n), return_counts=True)
+        self.reference = dict(zip(keys.tolist(), counts.tolist()))
+        self.reference_total = int(counts.sum())
+        self.selected = {}
+        self.overlap = 0
+        self.total = 0
+
+    def gain(self, counts):
+        """Extra clipped overlap if a sentence with these n-gram counts were added"""
+        gain = 0
+        for key, count in counts:
+            ref = self.reference.get(key)
+            if ref:
+                have = self.selected.get(key, 0)
+                if have < ref:
+                    gain += min(ref - have, count)
+        return gain
+
+    def add(self, counts, overlap_gain, size):
+        for key, count in counts:
+            self.selected[key] = self.selected.get(key, 0) + count
+        self.overlap += overlap_gain
+        self.total += size
+
+    def f1(self, overlap, total):
+        if not overlap:
+            return 0.0
+        precision = overlap / total
+        recall = overlap / self.reference_total
+        return 2 * precision * recall / (precision + recall)
+
+
+def greedy_oracle(sentences, reference, max_selected=3):
+    """Return 0/1 labels for sentences maximizing mean ROUGE-1/2 F1"""
+    reference_ids = token_ids(reference)
+    states = [_NgramState(reference_ids, n) for n in (1, 2)]
+    sentence_ids = [token_ids(s) for s in sentences]
+    # Per sentence and n: (unique n-gram counts, number of n-grams)
+    grams = []
+    for ids in sentence_ids:
+        per_n = []
+        for n in (1, 2):
+            keys = ngram_keys(ids, n)
+            unique, counts = np.unique(keys, return_counts=True)
+            per_n.append((list(zip(unique.tolist(), counts.tolist())), len(keys)))
+        grams.append(per_n)
+
+    labels = [0] * len(sentences)
+    best_score = 0.0
+    for _ in range(min(max_selected, len(sentences))):
+        best = None
+        for i in range(len(sentences)):
+            if labels[i]:
+                continue
+            gains = [state.gain(grams[i][k][0]) for k, state in enumerate(states)]
+            score = sum(state.f1(state.overlap + gains[k], state.total + grams[i][k][1])
+                        for k, state in enumerate(states)) / len(states)
+            if score > best_score and (best is None or score > best[0]):
+                best = (score, i, gains)
+        if best is None:
+            break
+        best_score, i, gains = best
+        labels[i] = 1
+        for k, state in enumerate(states):
+            state.add(grams[i][k][0], gains[k], grams[i][k][1])
+    return labels
+
+
+_preprocessor = None
+
+
+def _init_worker(preprocessor):
+    global _preprocessor
+    _preprocessor = preprocessor
+
+
+def _label_chunk(args):
+    records, max_selected = args
+    results = []
+    for text, reference in records:
+        sentences = split_into_sentences(text)
+        labels = greedy_oracle(sentences, reference, max_selected)
+        indices = [_preprocessor.text_to_indices(s) for s in sentences] if _preprocessor else None
+        results.append((sentences, labels, indices))
+    return results
+
+
+def label_corpus(corpus_path, output, preprocessor=None, max_selected=3, workers=None, chunk_size=64,
+                 docs_per_shard=10000, limit=None):
+    """Label a streamed corpus in parallel.
+
+    With a preprocessor, writes memory-mappable shards (see dataset_shards.py)
+    to the output directory; otherwise writes JSON lines of
+    {"sentences", "labels"} that dataset_shards.py can shard later.
+    """
+    tasks = ((chunk, max_selected) for chunk in chunked(iter_corpus(corpus_path, limit), chunk_size))
+    writer = ShardWriter(output, docs_per_shard) if preprocessor is not None else None
+    out = open(output, 'w', encoding='utf-8') if writer is None else None
+    start = time.time()
+    count = 0
+    try:
+        with Pool(workers, initializer=_init_worker, initargs=(preprocessor,)) as pool:
+            # imap keeps corpus order so outputs line up with the input
+            for results in pool.imap(_label_chunk, tasks):
+                for sentences, labels, indices in results:
+                    if writer is not None:
+                        writer.add(indices, labels)
+                    else:
+                        out.write(json.dumps({'sentences': sentences, 'labels': labels}) + '\n')
+                count += len(results)
+        if writer is not None:
+            writer.close(vocab_size=len(preprocessor.word_to_idx))
+    finally:
+        if out is not None:
+            out.close()
+    elapsed = time.time() - start
+    print(f"Labeled {count} documents in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.1f} docs/s)")
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate greedy ROUGE-oracle extractive labels")
+    parser.add_argument("corpus", help="JSON lines with 'text'/'article' and 'summary'/'abstract'")
+    parser.add_argument("output", help="shard directory (with --preprocessor) or JSONL file")
+    parser.add_argument("--preprocessor", help="write memory-mapped shards using this vocabulary")
+    parser.add_argument("--max-selected", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--docs-per-shard", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    preprocessor = load_preprocessor(args.preprocessor) if args.preprocessor else None
+    label_corpus(args.corpus, args.output, preprocessor, args.max_selected, args.workers, args.chunk_size,
+                 args.docs_per_shard, args.limit)
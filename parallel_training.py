@@ -0,0 +1,299 @@
+import time
+import queue
+import traceback
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+from model_classes import ImprovedExtractiveRNNSummarizer
+from dataset_shards import ShardedDataset
+from training import (
+    GradientBuffers,
+    TrainingEngine,
+    accumulate_document,
+    get_parameters,
+    set_parameter,
+    iter_batches,
+)
+from optimizers import SGD, optimizer_from_state
+
+# Data-parallel training over N worker processes.
+#
+# All model parameters live in one multiprocessing.shared_memory block that
+# every worker maps, so workers always read the current weights without any
+# broadcast. Each worker trains on a disjoint subset of the dataset shards.
+#
+#   mode='sync'   workers send their batch gradients to the coordinator,
+#                 which averages them, clips, runs one optimizer step on the
+#                 shared parameters and then releases the workers.
+#   mode='async'  Hogwild: every worker runs its own optimizer and writes
+#                 directly into the shared parameters without locks. Sparse
+#                 embedding updates rarely collide, which is what makes this
+#                 safe enough in practice.
+#
+# Workers report documents/sentences/tokens per second to the coordinator. A
+# worker that raises sends its traceback instead of 'done', and train()
+# re-raises it rather than returning a partly trained model.
+
+_ALIGN = 64
+
+
+class SharedParameters:
+    """Model parameters packed into a single shared memory block"""
+
+    def __init__(self, shm, layout):
+        self.shm = shm
+        self.layout = layout
+
+    @classmethod
+    def create(cls, model):
+        layout = []
+        offset = 0
+        for name, param in get_parameters(model).items():
+            layout.append((name, param.shape, param.dtype.str, offset))
+            offset += -(-param.nbytes // _ALIGN) * _ALIGN
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        shared = cls(shm, layout)
+        for name, array in shared.arrays().items():
+            array[...] = get_parameters(model)[name]
+        return shared
+
+    @classmethod
+    def attach(cls, name, layout):
+        return cls(shared_memory.SharedMemory(name=name), layout)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def arrays(self):
+        return {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+                for name, shape, dtype, offset in self.layout}
+
+    def bind(self, model):
+        """Point the model's parameter attributes at the shared arrays"""
+        for name, array in self.arrays().items():
+            set_parameter(model, name, array)
+
+    def copy_to(self, model):
+        for name, array in self.arrays().items():
+            set_parameter(model, name, array.copy())
+
+    def close(self):
+        self.shm.close()
+
+
+def _worker(rank, world_size, shm_name, layout, config, data_dir, options, results, go):
+    np.random.seed(options['seed'] + rank)
+    shared = SharedParameters.attach(shm_name, layout)
+    model = ImprovedExtractiveRNNSummarizer(**config)
+    model.word_encoder.dropout = options['dropout']
+    shared.bind(model)
+
+    sync = options['mode'] == 'sync'
+    if sync:
+        buffers = GradientBuffers(model)
+    else:
+        engine = TrainingEngine(model, batch_size=options['batch_size'], max_grad_norm=options['max_grad_norm'],
+                                bptt_steps=options['bptt_steps'],
+                                optimizer=optimizer_from_state(options['optimizer']),
+                                checkpoint_every=options['checkpoint_every'])
+
+    dataset = ShardedDataset(data_dir, seed=options['seed'], cache=True, rank=rank, world_size=world_size)
+    stats = {'documents': 0, 'sentences': 0, 'tokens': 0, 'loss': 0.0, 'elapsed': 0.0}
+    start = time.time()
+    last_report = start
+    try:
+        for epoch in range(options['epochs']):
+            for batch in iter_batches(dataset.iter_epoch(epoch), options['batch_size']):
+                if sync:
+                    buffers.zero()
+                    for sentences, labels in batch:
+                        accumulate_document(model, sentences, labels, buffers, options['bptt_steps'],
+                                            options['checkpoint_every'])
+                    rows, row_grads = buffers.embedding_gradient()
+                    results.put(('grad', rank, buffers.dense, rows, row_grads, buffers.num_sentences))
+                    go.get()
+                    loss = buffers.loss
+                else:
+                    loss = engine.train_batch(batch) * engine.buffers.num_sentences
+
+                stats['documents'] += len(batch)
+                stats['sentences'] += sum(len(labels) for _, labels in batch)
+                stats['tokens'] += sum(len(s) for sentences, _ in batch for s in sentences)
+                stats['loss'] += loss
+                now = time.time()
+                if now - last_report >= options['report_every']:
+                    stats['elapsed'] = now - start
+                    results.put(('stats', rank, dict(stats)))
+                    last_report = now
+    except BaseException:
+        results.put(('error', rank, traceback.format_exc()))
+        raise
+    else:
+        stats['elapsed'] = time.time() - start
+        results.put(('done', rank, dict(stats)))
+    finally:
+        shared.close()
+
+
+def format_throughput(rank, stats):
+    elapsed = max(stats['elapsed'], 1e-9)
+    mean_loss = stats['loss'] / max(stats['sentences'], 1)
+    return (f"worker {rank}: {stats['documents']} docs, {stats['documents'] / elapsed:.1f} docs/s, "
+            f"{stats['tokens'] / elapsed:.0f} tokens/s, loss {mean_loss:.4f}")
+
+
+class ParallelTrainer:
+    """Runs TrainingEngine-equivalent training over num_workers processes"""
+
+    def __init__(self, model, data_dir, num_workers=None, mode='sync', optimizer=None, batch_size=32,
+                 max_grad_norm=5.0, bptt_steps=None, epochs=1, seed=0, report_every=10.0,
+                 checkpoint_every=None):
+        if mode not in ('sync', 'async'):
+            raise ValueError("mode must be 'sync' or 'async'")
+        self.model = model
+        self.data_dir = data_dir
+        self.num_workers = num_workers or mp.cpu_count()
+        self.mode = mode
+        self.optimizer = optimizer or SGD(0.01)
+        self.batch_size = batch_size
+        self.max_grad_norm = max_grad_norm
+        self.bptt_steps = bptt_steps
+        self.checkpoint_every = checkpoint_every
+        self.epochs = epochs
+        self.seed = seed
+        self.report_every = report_every
+        self.worker_stats = {}
+
+    def _options(self):
+        return {
+            'mode': self.mode,
+            'batch_size': self.batch_size,
+            'max_grad_norm': self.max_grad_norm,
+            'bptt_steps': self.bptt_steps,
+            'checkpoint_every': self.checkpoint_every,
+            'epochs': self.epochs,
+            'seed': self.seed,
+            'report_every': self.report_every,
+            'dropout': self.model.word_encoder.dropout,
+            'optimizer': self.optimizer.state_dict(),
+        }
+
+    def train(self):
+        num_shards = len(ShardedDataset(self.data_dir).shard_names)
+        world_size = min(self.num_workers, num_shards)
+        if world_size < self.num_workers:
+            print(f"Only {num_shards} shards; using {world_size} workers")
+
+        config = {'vocab_size': self.model.vocab_size, 'embed_dim': self.model.embed_dim,
+                  'hidden_dim': self.model.hidden_dim}
+        shared = SharedParameters.create(self.model)
+        ctx = mp.get_context()
+        results = ctx.Queue()
+        go_queues = [ctx.Queue() for _ in range(world_size)]
+        options = self._options()
+        workers = [ctx.Process(target=_worker,
+                               args=(rank, world_size, shared.name, shared.layout, config, self.data_dir,
+                                     options, results, go_queues[rank]))
+                   for rank in range(world_size)]
+        start = time.time()
+        try:
+            for worker in workers:
+                worker.start()
+            self._coordinate(shared, results, go_queues, workers)
+        finally:
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+            shared.copy_to(self.model)
+            shared.close()
+            shared.shm.unlink()
+
+        elapsed = time.time() - start
+        total_docs = sum(s['documents'] for s in self.worker_stats.values())
+        print(f"Parallel training done ({self.mode}, {world_size} workers): "
+              f"{total_docs} documents in {elapsed:.1f}s, {total_docs / max(elapsed, 1e-9):.1f} docs/s")
+        for rank in sorted(self.worker_stats):
+            print("  " + format_throughput(rank, self.worker_stats[rank]))
+        return self.worker_stats
+
+    def _coordinate(self, shared, results, go_queues, workers):
+        params = shared.arrays()
+        buffers = GradientBuffers(self.model)
+        active = set(range(len(workers)))
+        waiting = []
+
+        while active:
+            try:
+                message = results.get(timeout=1.0)
+            except queue.Empty:
+                dead = [rank for rank in active if not workers[rank].is_alive()]
+                if dead:
+                    raise RuntimeError(f"Workers {dead} exited without finishing")
+                continue
+
+            kind, rank = message[0], message[1]
+            if kind == 'stats':
+                self.worker_stats[rank] = message[2]
+                print(format_throughput(rank, message[2]))
+            elif kind == 'done':
+                self.worker_stats[rank] = message[2]
+                active.discard(rank)
+            elif kind == 'error':
+                raise RuntimeError(f"Worker {rank} failed:\n{message[2]}")
+            elif kind == 'grad':
+                _, _, dense, rows, row_grads, num_sentences = message
+                for name, grad in dense.items():
+                    buffers.dense[name] += grad
+                buffers.add_embedding(rows, row_grads)
+                buffers.num_sentences += num_sentences
+                waiting.append(rank)
+
+            # Synchronous step once every still-running worker has reported
+            if waiting and len(waiting) == len(active):
+                if buffers.num_sentences:
+                    buffers.scale(1.0 / buffers.num_sentences)
+                    buffers.clip_by_global_norm(self.max_grad_norm)
+                    self.optimizer.step(params, buffers)
+                buffers.zero()
+                for rank in waiting:
+                    go_queues[rank].put(True)
+                waiting = []
+
+
+if __name__ == "__main__":
+    import argparse
+    from dataset_shards import load_preprocessor
+    from optimizers import OPTIMIZERS, make_optimizer
+    from training import save_model
+
+    parser = argparse.ArgumentParser(description="Data-parallel training on pre-tokenized shards")
+    parser.add_argument("data_dir", help="output of dataset_shards.py")
+    parser.add_argument("--preprocessor", required=True)
+    parser.add_argument("--output", default="improved_rnn_model.pkl")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--optimizer", choices=sorted(OPTIMIZERS), default="adam")
+    parser.add_argument("--learning-rate", type=float, default=0.001)
+    parser.add_argument("--max-grad-norm", type=float, default=5.0)
+    parser.add_argument("--bptt-steps", type=int, default=None)
+    parser.add_argument("--checkpoint-every", type=int, default=None)
+    parser.add_argument("--embed-dim", type=int, default=64)
+    parser.add_argument("--hidden-dim", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    preprocessor = load_preprocessor(args.preprocessor)
+    model = ImprovedExtractiveRNNSummarizer(len(preprocessor.word_to_idx), args.embed_dim, args.hidden_dim)
+    optimizer = make_optimizer(args.optimizer, learning_rate=args.learning_rate)
+    trainer = ParallelTrainer(model, args.data_dir, args.workers, args.mode, optimizer, args.batch_size,
+                              args.max_grad_norm, args.bptt_steps, args.epochs, args.seed,
+                              checkpoint_every=args.checkpoint_every)
+    trainer.train()
+    save_model(args.output, model, preprocessor, optimizer if args.mode == 'sync' else None)
+    print(f"Saved model to {args.output}")
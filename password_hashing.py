@@ -0,0 +1,167 @@
+import os
+import sys
+import time
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+
+# Password hashing off the request threads.
+#
+# bcrypt is deliberately slow CPU work, and run inline it holds a request
+# thread (and the GIL) for the whole hash. PasswordHasher sends it to a small
+# process pool instead. At most workers + max_queue operations are accepted;
+# beyond that callers wait up to queue_timeout seconds and then get
+# HasherBusy, so a login storm queues in front of the pool rather than in
+# every request thread. Hashes are bcrypt strings compatible with the ones
+# flask_bcrypt.Bcrypt produced before.
+#
+# The cost factor is calibrated at startup: the largest number of rounds
+# whose hash takes at most target_seconds on this machine, within
+# [min_rounds, max_rounds]. The floor of 12 is flask_bcrypt's default, so
+# calibration never weakens new hashes. needs_rehash() tells login when a
+# stored hash uses fewer rounds than the current setting.
+#
+# Workers use the platform's default start method and are all started in
+# the constructor, so create the hasher before the app starts any threads.
+# With spawn or forkserver (Windows, macOS) a new process normally re-runs
+# the main script; while the workers start, the main module's path is hidden
+# so that `python app.py` is not executed again in every worker.
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _hash(password, rounds, prefix):
+    started = time.time()
+    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds, prefix=prefix))
+    return hashed.decode('utf-8'), started, time.time() - started
+
+
+def _check(hashed, password):
+    started = time.time()
+    try:
+        ok = bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        ok = False  # malformed stored hash
+    return ok, started, time.time() - started
+
+
+def _ping():
+    return os.getpid()
+
+
+@contextmanager
+def _main_script_hidden(context):
+    main = sys.modules.get('__main__')
+    path = getattr(main, '__file__', None)
+    # Only a script run as `python app.py` is re-run; `-m` modules are imported by name
+    if context.get_start_method() == 'fork' or path is None or getattr(main, '__spec__', None) is not None:
+        yield
+        return
+    del main.__file__
+    try:
+        yield
+    finally:
+        main.__file__ = path
+
+
+def hash_rounds(hashed):
+    """Cost factor of a '$2b$12$...' hash, or None if it is not a bcrypt hash"""
+    parts = (hashed or '').split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    def __init__(self, workers=None, max_queue=64, queue_timeout=2.0, rounds=None, target_seconds=0.25,
+                 min_rounds=12, max_rounds=14, prefix=b'2b'):
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.prefix = prefix
+        self.min_rounds = min_rounds
+        self.max_rounds = max_rounds
+        self._context = multiprocessing.get_context()
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=self._context)
+        self._slots = threading.BoundedSemaphore(self.workers + max_queue)
+        self._lock = threading.Lock()
+        self.stats = {'operations': 0, 'rejected': 0, 'queue_seconds_total': 0.0, 'queue_seconds_max': 0.0,
+                      'work_seconds_total': 0.0}
+        self.start_workers()
+        self.rounds = rounds or self.calibrate(target_seconds)
+
+    @classmethod
+    def from_env(cls):
+        workers = int(os.getenv('BCRYPT_WORKERS', 0)) or None
+        rounds = int(os.getenv('BCRYPT_LOG_ROUNDS', 0)) or None
+        return cls(workers=workers, rounds=rounds, target_seconds=float(os.getenv('BCRYPT_TARGET_MS', 250)) / 1000,
+                   max_queue=int(os.getenv('BCRYPT_MAX_QUEUE', 64)))
+
+    def start_workers(self):
+        """Start every worker now rather than on the first request"""
+        # Concurrent tasks make the executor launch a process for each
+        with _main_script_hidden(self._context):
+            futures = [self._pool.submit(_ping) for _ in range(self.workers)]
+        return len({f.result() for f in futures})
+
+    def calibrate(self, target_seconds):
+        """Largest rounds whose hash fits in target_seconds"""
+        futures = [self._pool.submit(_hash, 'calibration', self.min_rounds, self.prefix)
+                   for _ in range(self.workers)]
+        seconds = min(f.result()[2] for f in futures)
+        rounds = self.min_rounds
+        # Each extra round doubles the work
+        while rounds < self.max_rounds and seconds * 2 <= target_seconds:
+            seconds *= 2
+            rounds += 1
+        print(f"bcrypt calibrated to {rounds} rounds (~{seconds * 1000:.0f} ms per hash, {self.workers} workers)")
+        return rounds
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.stats['rejected'] += 1
+            raise HasherBusy("Password hashing queue is full")
+        try:
+            submitted = time.time()
+            result, started, work_seconds = self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+        queued = max(0.0, started - submitted)
+        with self._lock:
+            self.stats['operations'] += 1
+            self.stats['queue_seconds_total'] += queued
+            self.stats['queue_seconds_max'] = max(self.stats['queue_seconds_max'], queued)
+            self.stats['work_seconds_total'] += work_seconds
+        return result
+
+    def hash_password(self, password):
+        return self._run(_hash, password, self.rounds, self.prefix)
+
+    def check_password(self, hashed, password):
+        return self._run(_check, hashed, password)
+
+    def needs_rehash(self, hashed):
+        rounds = hash_rounds(hashed)
+        return rounds is not None and rounds < self.rounds
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        count = max(stats['operations'], 1)
+        return {
+            'rounds': self.rounds,
+            'workers': self.workers,
+            'operations': stats['operations'],
+            'rejected': stats['rejected'],
+            'mean_queue_ms': stats['queue_seconds_total'] / count * 1000,
+            'max_queue_ms': stats['queue_seconds_max'] * 1000,
+            'mean_work_ms': stats['work_seconds_total'] / count * 1000,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,186 @@
+# search.py
+import os
+import re
+import time
+import traceback
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy import text
+from models import db
+from auth import current_user_id
+
+# Full-text search over a user's saved summaries and the notes they came from.
+#
+# summaries_fts is an SQLite FTS5 index over the summaries_search view (one
+# row per user summary: owner, summary text, input text). It is an external
+# content table: it stores only the inverted index, and reads the view for
+# snippets. Triggers on summaries keep it current, whether rows come from the
+# ORM or the write batcher. The write batcher inserts inputs before the
+# summaries that reference them; should a summary still arrive first, it is
+# indexed without its note text and the summary_inputs trigger reindexes it
+# once the input row exists. The owner column holds a 'u<user id>' token, so a
+# search intersects the user's posting list with the query's instead of
+# filtering other users' matches afterwards.
+#
+# Tokens match TextPreprocessor.tokenize: lowercased runs of word characters
+# (letters, digits and underscore). Results are ranked by bm25 with summary
+# matches weighted above note matches. A term ending in '*' matches as a
+# prefix; 2- and 3-character prefix indexes keep those fast.
+#
+# Only SQLite has FTS5; on other databases /search answers 503.
+
+_TOKEN_RE = re.compile(r'\b\w+\b')  # same as TextPreprocessor.tokenize
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+MAX_OFFSET = 500
+SNIPPET_TOKENS = 16
+# bm25 column weights: owner, summary, text
+RANK_WEIGHTS = (0.0, 2.0, 1.0)
+
+SCHEMA = [
+    """CREATE VIEW IF NOT EXISTS summaries_search AS
+       SELECT s.id AS id, 'u' || s.user_id AS owner, s.summary AS summary, i.text AS text
+       FROM summaries s JOIN summary_inputs i ON i.hash = s.input_hash
+       WHERE s.user_id IS NOT NULL""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5(
+       owner, summary, text,
+       content='summaries_search', content_rowid='id',
+       tokenize="unicode61 remove_diacritics 0 tokenchars '_'", prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS summaries_fts_insert AFTER INSERT ON summaries
+       WHEN new.user_id IS NOT NULL BEGIN
+         INSERT INTO summaries_fts (rowid, owner, summary, text)
+         VALUES (new.id, 'u' || new.user_id, new.summary,
+                 (SELECT text FROM summary_inputs WHERE hash = new.input_hash));
+       END""",
+    # Catch-up for summaries indexed before their input existed (text was NULL)
+    """CREATE TRIGGER IF NOT EXISTS summaries_fts_input_insert AFTER INSERT ON summary_inputs BEGIN
+         INSERT INTO summaries_fts (summaries_fts, rowid, owner, summary, text)
+         SELECT 'delete', s.id, 'u' || s.user_id, s.summary, NULL
+         FROM summaries s WHERE s.input_hash = new.hash AND s.user_id IS NOT NULL;
+         INSERT INTO summaries_fts (rowid, owner, summary, text)
+         SELECT s.id, 'u' || s.user_id, s.summary, new.text
+         FROM summaries s WHERE s.input_hash = new.hash AND s.user_id IS NOT NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS summaries_fts_delete AFTER DELETE ON summaries
+       WHEN old.user_id IS NOT NULL BEGIN
+         INSERT INTO summaries_fts (summaries_fts, rowid, owner, summary, text)
+         VALUES ('delete', old.id, 'u' || old.user_id, old.summary,
+                 (SELECT text FROM summary_inputs WHERE hash = old.input_hash));
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS summaries_fts_update AFTER UPDATE ON summaries BEGIN
+         INSERT INTO summaries_fts (summaries_fts, rowid, owner, summary, text)
+         SELECT 'delete', old.id, 'u' || old.user_id, old.summary,
+                (SELECT text FROM summary_inputs WHERE hash = old.input_hash)
+         WHERE old.user_id IS NOT NULL;
+         INSERT INTO summaries_fts (rowid, owner, summary, text)
+         SELECT new.id, 'u' || new.user_id, new.summary,
+                (SELECT text FROM summary_inputs WHERE hash = new.input_hash)
+         WHERE new.user_id IS NOT NULL;
+       END""",
+]
+
+search = Blueprint("search", __name__)
+SEARCH_AVAILABLE = False
+
+
+def init_search(engine):
+    """Create the FTS index and its triggers (SQLite only); indexes existing summaries the first time"""
+    global SEARCH_AVAILABLE
+    if engine.dialect.name != 'sqlite':
+        print("Full-text search needs SQLite FTS5; /search is disabled")
+        return False
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'summaries_fts'")).first()
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text("INSERT INTO summaries_fts (summaries_fts) VALUES ('rebuild')"))
+    SEARCH_AVAILABLE = True
+    return True
+
+
+def fts_query(query):
+    """FTS5 MATCH expression for a user query: every term must match, 'term*' as a prefix"""
+    terms = []
+    for word in query.split():
+        tokens = _TOKEN_RE.findall(word.lower())
+        if not tokens:
+            continue
+        # Quoted, so FTS5 operators in user input are matched as plain words
+        phrase = '"' + ' '.join(tokens) + '"'
+        terms.append(phrase + '*' if word.endswith('*') else phrase)
+    return ' '.join(terms)
+
+
+def search_summaries(user_id, query, limit=DEFAULT_LIMIT, offset=0):
+    match = fts_query(query)
+    if not match:
+        return []
+    rows = db.session.execute(text(f"""
+        SELECT summaries_fts.rowid, bm25(summaries_fts, {', '.join(map(str, RANK_WEIGHTS))}) AS score,
+               snippet(summaries_fts, 1, '**', '**', '...', {SNIPPET_TOKENS}),
+               snippet(summaries_fts, 2, '**', '**', '...', {SNIPPET_TOKENS}),
+               s.created_at, s.model_version
+        FROM summaries_fts JOIN summaries s ON s.id = summaries_fts.rowid
+        WHERE summaries_fts MATCH :match
+        ORDER BY score
+        LIMIT :limit OFFSET :offset"""),
+        {"match": f'owner : "u{int(user_id)}" AND ({match})', "limit": limit, "offset": offset})
+    return [{
+        "id": row[0],
+        "score": -row[1],  # bm25 is lower for better matches
+        "summary_snippet": row[2],
+        "text_snippet": row[3],
+        "created_at": str(row[4]) if row[4] is not None else None,
+        "model_version": row[5],
+    } for row in rows]
+
+
+@search.route('', methods=['GET'])
+@jwt_required()
+def search_view():
+    """Ranked search over the user's summaries: ?q=&limit=&offset="""
+    if not SEARCH_AVAILABLE:
+        return jsonify({"error": "Search is not available on this database"}), 503
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+    try:
+        limit = min(max(request.args.get("limit", DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+        offset = min(max(request.args.get("offset", 0, type=int), 0), MAX_OFFSET)
+        started = time.perf_counter()
+        results = search_summaries(current_user_id(), query, limit, offset)
+        return jsonify({
+            "items": results,
+            "next_offset": offset + limit if len(results) == limit and offset + limit <= MAX_OFFSET else None,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        })
+    except Exception as e:
+        print(f"Search error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": "Search failed"}), 500
+
+
+if __name__ == "__main__":
+    import argparse
+    from flask import Flask
+
+    parser = argparse.ArgumentParser(description="Maintain the summaries full-text index")
+    parser.add_argument("--rebuild", action="store_true", help="reindex every summary from scratch")
+    parser.add_argument("--optimize", action="store_true", help="merge the index into a single b-tree")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///mydb.sqlite3')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        init_search(db.engine)
+        start = time.time()
+        with db.engine.begin() as conn:
+            if args.rebuild:
+                conn.execute(text("INSERT INTO summaries_fts (summaries_fts) VALUES ('rebuild')"))
+            if args.optimize:
+                conn.execute(text("INSERT INTO summaries_fts (summaries_fts) VALUES ('optimize')"))
+    print(f"Search index ready in {time.time() - start:.1f}s")
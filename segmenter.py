@@ -0,0 +1,189 @@
+import re
+
+# Single-pass sentence segmentation.
+#
+# Sentences are reported as (start, end) character offsets into the input;
+# no substrings are built unless the caller slices them. A run of . ! ? ends
+# a sentence only when it is followed by whitespace (after any closing quotes
+# or brackets) or the end of the text, so decimals ("3.14"), version numbers
+# and URLs are not split, and a "." after a known abbreviation or a single
+# capital initial ("Dr.", "e.g.", "J. Smith") is not a boundary.
+#
+# Sentences longer than max_length words are cut into max_length-word chunks
+# and sentences with fewer than min_words words are dropped, as
+# split_into_sentences always did. StreamingSegmenter also cuts a sentence
+# that grows past max_chars characters, so a stream without whitespace or
+# terminators cannot make it buffer the whole input.
+
+_TERMINATOR_RE = re.compile(r'[.!?]+')
+_WORD_RE = re.compile(r'\S+')
+_TOKEN_BEFORE_RE = re.compile(r'[A-Za-z][A-Za-z.]*$')
+_CLOSERS = '"\')]”’'
+# StreamingSegmenter cuts a pending sentence at this many characters
+MAX_SENTENCE_CHARS = 2000
+
+ABBREVIATIONS = frozenset([
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'mt', 'vs', 'approx', 'dept', 'est', 'fig', 'figs',
+    'eq', 'vol', 'ch', 'sec', 'cf', 'al', 'e.g', 'i.e', 'a.m', 'p.m', 'u.s', 'u.k', 'ph.d', 'jan', 'feb',
+    'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+])
+
+
+def _boundary_end(text, match, final):
+    """Where the next sentence may start, False if not a boundary, None if more text is needed"""
+    end = match.end()
+    while end < len(text) and text[end] in _CLOSERS:
+        end += 1
+    if end == len(text):
+        return end if final else None
+    if not text[end].isspace():
+        return False
+    if match.group() == '.':
+        # Only the last 20 characters are looked at, so this stays O(1)
+        token = _TOKEN_BEFORE_RE.search(text, max(0, match.start() - 20), match.start())
+        if token:
+            word = token.group()
+            if word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isupper()):
+                return False
+    return end
+
+
+def _chunk_spans(text, start, end, max_length, min_words, chunked=False):
+    """Word-aligned spans of text[start:end], max_length words each"""
+    chunk_start = chunk_end = None
+    count = 0
+    for word in _WORD_RE.finditer(text, start, end):
+        if count == max_length:
+            yield chunk_start, chunk_end
+            chunked = True
+            count = 0
+        if count == 0:
+            chunk_start = word.start()
+        chunk_end = word.end()
+        count += 1
+    if count and (chunked or count >= min_words):
+        yield chunk_start, chunk_end
+
+
+def iter_sentence_spans(text, max_length=30, min_words=3):
+    """Lazily yield (start, end) offsets of the sentences in text"""
+    start = 0
+    for match in _TERMINATOR_RE.finditer(text):
+        next_start = _boundary_end(text, match, final=True)
+        if next_start is False:
+            continue
+        yield from _chunk_spans(text, start, match.start(), max_length, min_words)
+        start = next_start
+    yield from _chunk_spans(text, start, len(text), max_length, min_words)
+
+
+class StreamingSegmenter:
+    """Segments text that arrives in chunks; feed() and close() return (start, end, sentence) triples.
+
+    Offsets are relative to the whole stream. Only the current unfinished
+    sentence is kept between calls, and each feed() scans only the new text.
+    A sentence that is already longer than max_length words is emitted chunk
+    by chunk, and one that runs past max_chars characters without enough
+    words to chunk (e.g. a long run with no whitespace) is cut there, so
+    memory does not grow with the input.
+    """
+
+    def __init__(self, max_length=30, min_words=3, max_chars=MAX_SENTENCE_CHARS):
+        self.max_length = max_length
+        self.min_words = min_words
+        self.max_chars = max_chars
+        self._buffer = ''
+        self._offset = 0
+        self._chunked = False
+        # Where the terminator and word scans resume, and the complete words
+        # of the pending sentence (all relative to the buffer)
+        self._scan = 0
+        self._word_scan = 0
+        self._words = []
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        return self._drain(final=False)
+
+    def close(self):
+        return self._drain(final=True)
+
+    def _emit(self, spans, out):
+        for s, e in spans:
+            out.append((self._offset + s, self._offset + e, self._buffer[s:e]))
+
+    def _drain(self, final):
+        text = self._buffer
+        out = []
+        start = 0
+        self._scan, scan = len(text), self._scan
+        for match in _TERMINATOR_RE.finditer(text, scan):
+            next_start = _boundary_end(text, match, final)
+            if next_start is None:
+                # Decided once more text arrives; rescan from here
+                self._scan = match.start()
+                break
+            if next_start is False:
+                continue
+            self._emit(_chunk_spans(text, start, match.start(), self.max_length, self.min_words, self._chunked),
+                       out)
+            self._chunked = False
+            start = next_start
+            self._word_scan = start
+            self._words = []
+
+        if final:
+            self._emit(_chunk_spans(text, start, len(text), self.max_length, self.min_words, self._chunked), out)
+            self._buffer = ''
+            self._offset += len(text)
+            self._chunked = False
+            self._scan = self._word_scan = 0
+            self._words = []
+            return out
+
+        # A pending sentence with more than max_length complete words will be
+        # chunked anyway; emit its full chunks now. A trailing word may still
+        # continue, so the next scan starts at it.
+        word_scan, self._word_scan = self._word_scan, len(text)
+        for word in _WORD_RE.finditer(text, word_scan):
+            if word.end() == len(text):
+                self._word_scan = word.start()
+                break
+            self._words.append(word.span())
+        while len(self._words) > self.max_length:
+            self._emit([(self._words[0][0], self._words[self.max_length - 1][1])], out)
+            self._chunked = True
+            start = self._words[self.max_length][0]
+            self._words = self._words[self.max_length:]
+
+        # Hard cut for a pending sentence that the word count cannot bound
+        while len(text) - start > self.max_chars:
+            cut = start + self.max_chars
+            self._emit(_chunk_spans(text, start, cut, self.max_length, self.min_words, True), out)
+            self._chunked = True
+            start = cut
+            self._words = []
+            self._word_scan = start
+
+        self._offset += start
+        self._buffer = text[start:]
+        self._scan = max(self._scan - start, 0)
+        self._word_scan -= start
+        self._words = [(s - start, e - start) for s, e in self._words]
+        return out
+
+
+def iter_stream_sentences(chunks, max_length=30, min_words=3):
+    """Yield (start, end, sentence) from an iterable of text chunks (e.g. a file read in blocks)"""
+    segmenter = StreamingSegmenter(max_length, min_words)
+    for chunk in chunks:
+        yield from segmenter.feed(chunk)
+    yield from segmenter.close()
+
+
+def iter_file_chunks(f, chunk_chars=1 << 16):
+    while True:
+        chunk = f.read(chunk_chars)
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,143 @@
+# summaries.py
+import json
+import base64
+import hashlib
+import traceback
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, verify_jwt_in_request, get_jwt_identity
+from sqlalchemy import tuple_
+from models import db, Summary, SummaryInput
+from auth import current_user_id
+
+# Summary history and reuse.
+#
+# Every model summary is stored as a Summary row (input hash, options, model
+# version, summary text) for the user who asked, or with no user for
+# anonymous requests. Input texts live in summary_inputs keyed by their
+# sha256, so a text sent by many users, or many times, is stored once.
+#
+# Before running the model, /summarize looks for a stored summary of the
+# same hash, options and model version (an index lookup on
+# ix_summaries_input_version) and returns it instead. Retraining the model
+# changes its version, so stale summaries are never served.
+#
+# Rows are written through the app's WriteBatcher, off the request thread,
+# so a summary appears in history (and becomes reusable) within a flush
+# interval of being produced.
+
+summaries = Blueprint("summaries", __name__)
+write_batcher = None
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+PREVIEW_LENGTH = 200
+
+
+def set_write_batcher(batcher):
+    """Store history through this WriteBatcher"""
+    global write_batcher
+    write_batcher = batcher
+
+
+def input_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def summary_params(**params):
+    """Canonical JSON of the options that change a summary"""
+    return json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+
+def optional_user_id():
+    """User id of a valid JWT on the request, else None"""
+    try:
+        if verify_jwt_in_request(optional=True):
+            return int(get_jwt_identity())
+    except Exception:
+        pass
+    return None
+
+
+def find_summaries(text_hash, model_version, params):
+    """Stored summaries of this input with the same options and model version"""
+    return (Summary.query
+            .filter(Summary.input_hash == text_hash, Summary.model_version == model_version,
+                    Summary.params == params)
+            .limit(50).all())
+
+
+def record_summary(user_id, text, text_hash, params, model_version, summary):
+    """Queue the input (if new) and a Summary row; False if history is unavailable or full"""
+    if write_batcher is None:
+        return False
+    now = datetime.utcnow()
+    write_batcher.add(SummaryInput, ignore_duplicates=True, hash=text_hash, text=text, created_at=now)
+    return write_batcher.add(Summary, user_id=user_id, input_hash=text_hash, params=params,
+                             model_version=model_version, summary=summary, created_at=now)
+
+
+def summary_to_dict(summary, text=None, preview=None):
+    result = {
+        "id": summary.id,
+        "summary": summary.summary,
+        "options": json.loads(summary.params),
+        "model_version": summary.model_version,
+        "input_hash": summary.input_hash,
+        "created_at": summary.created_at.isoformat() if summary.created_at else None,
+    }
+    if text is not None:
+        result["text"] = text
+    if preview is not None:
+        result["preview"] = preview
+    return result
+
+
+def encode_cursor(summary):
+    raw = json.dumps([summary.created_at.isoformat(), summary.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, summary_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    return datetime.fromisoformat(created_at), int(summary_id)
+
+
+@summaries.route('', methods=['GET'])
+@jwt_required()
+def list_summaries():
+    """The user's summaries, newest first: ?limit=&cursor="""
+    try:
+        limit = min(max(request.args.get("limit", DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        try:
+            cursor = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        except Exception:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+        preview = db.func.substr(SummaryInput.text, 1, PREVIEW_LENGTH)
+        query = (db.session.query(Summary, preview)
+                 .join(SummaryInput, SummaryInput.hash == Summary.input_hash)
+                 .filter(Summary.user_id == current_user_id()))
+        if cursor is not None:
+            query = query.filter(tuple_(Summary.created_at, Summary.id) < tuple_(*cursor))
+        # One extra row tells whether there is a next page
+        rows = query.order_by(Summary.created_at.desc(), Summary.id.desc()).limit(limit + 1).all()
+        page = rows[:limit]
+        return jsonify({
+            "items": [summary_to_dict(s, preview=p) for s, p in page],
+            "next_cursor": encode_cursor(page[-1][0]) if len(rows) > limit else None,
+        })
+    except Exception as e:
+        print(f"Summary history error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": "Failed to load summaries"}), 500
+
+
+@summaries.route('/<int:summary_id>', methods=['GET'])
+@jwt_required()
+def get_summary(summary_id):
+    summary = Summary.query.filter_by(id=summary_id, user_id=current_user_id()).first()
+    if summary is None:
+        return jsonify({"error": "Summary not found"}), 404
+    return jsonify(summary_to_dict(summary, text=summary.input.text))
@@ -0,0 +1,41 @@
+import multiprocessing as mp
+import numpy as np
+import pytest
+
+import parallel_training
+from dataset_shards import ShardWriter
+from model_classes import ImprovedExtractiveRNNSummarizer
+
+
+def make_shards(path, docs=8, docs_per_shard=4):
+    rng = np.random.RandomState(0)
+    writer = ShardWriter(str(path), docs_per_shard=docs_per_shard)
+    for _ in range(docs):
+        sentences = [list(rng.randint(2, 50, size=6)) for _ in range(4)]
+        writer.add(sentences, [1, 0, 0, 1])
+    writer.close()
+
+
+def failing_accumulate(*args, **kwargs):
+    raise ValueError("injected worker failure")
+
+
+@pytest.mark.skipif(mp.get_start_method() != 'fork', reason="workers must inherit the patched function")
+@pytest.mark.parametrize('mode', ['sync', 'async'])
+def test_worker_failure_is_raised(tmp_path, monkeypatch, mode):
+    make_shards(tmp_path)
+    # sync workers call accumulate_document directly, async ones through TrainingEngine
+    monkeypatch.setattr(parallel_training, 'accumulate_document', failing_accumulate)
+    monkeypatch.setattr(parallel_training.TrainingEngine, 'train_batch', failing_accumulate)
+    model = ImprovedExtractiveRNNSummarizer(50, 8, 8)
+    trainer = parallel_training.ParallelTrainer(model, str(tmp_path), num_workers=2, mode=mode, batch_size=2)
+    with pytest.raises(RuntimeError, match="injected worker failure"):
+        trainer.train()
+
+
+def test_training_completes(tmp_path):
+    make_shards(tmp_path)
+    model = ImprovedExtractiveRNNSummarizer(50, 8, 8)
+    trainer = parallel_training.ParallelTrainer(model, str(tmp_path), num_workers=2, mode='sync', batch_size=2)
+    stats = trainer.train()
+    assert sum(s['documents'] for s in stats.values()) == 8
@@ -0,0 +1,54 @@
+from flask import Flask
+from sqlalchemy import event, text
+
+from models import db, Summary, SummaryInput
+from write_batcher import WriteBatcher
+
+
+def make_app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'batch.db'}"
+    db.init_app(app)
+    with app.app_context():
+        # SQLite only checks foreign keys when asked, as MySQL always does
+        event.listen(db.engine, 'connect', lambda conn, record: conn.execute('PRAGMA foreign_keys = ON'))
+        db.create_all()
+    return app
+
+
+def add_summary(batcher, text_hash, summary):
+    batcher.add(Summary, user_id=None, input_hash=text_hash, params='{}', model_version='v', summary=summary)
+
+
+def test_children_are_written_after_their_parents(tmp_path):
+    app = make_app(tmp_path)
+    batcher = WriteBatcher(app, db)
+    batcher.add(SummaryInput, ignore_duplicates=True, hash='a', text='first note')
+    add_summary(batcher, 'a', 'first summary')
+    batcher.flush()
+
+    # The batch starts with a Summary whose input went out in the previous flush
+    add_summary(batcher, 'a', 'first summary again')
+    batcher.add(SummaryInput, ignore_duplicates=True, hash='b', text='second note')
+    add_summary(batcher, 'b', 'second summary')
+    batcher.flush()
+
+    assert batcher.snapshot()['failed'] == 0
+    with app.app_context():
+        rows = db.session.execute(text("SELECT input_hash, summary FROM summaries ORDER BY id")).all()
+    assert [tuple(row) for row in rows] == [('a', 'first summary'), ('a', 'first summary again'),
+                                            ('b', 'second summary')]
+
+
+def test_duplicate_inputs_are_skipped(tmp_path):
+    app = make_app(tmp_path)
+    batcher = WriteBatcher(app, db)
+    for _ in range(3):
+        batcher.add(SummaryInput, ignore_duplicates=True, hash='a', text='note')
+        add_summary(batcher, 'a', 'summary')
+    batcher.flush()
+
+    assert batcher.snapshot()['written'] == 6
+    with app.app_context():
+        assert db.session.execute(text("SELECT COUNT(*) FROM summary_inputs")).scalar() == 1
+        assert db.session.execute(text("SELECT COUNT(*) FROM summaries")).scalar() == 3
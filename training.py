@@ -0,0 +1,459 @@
+import os
+import time
+import pickle
+import numpy as np
+
+from optimizers import SGD
+
+# Mini-batch training engine for ImprovedExtractiveRNNSummarizer.
+#
+# Unlike the models' own backward() methods, which update weights inside
+# their per-timestep loops, the engine only accumulates gradients while it
+# walks a batch of documents and then applies a single update per batch:
+#   - recurrent and classifier weights get dense gradient buffers
+#   - the embedding table gets a sparse (row index, row gradient) buffer, so
+#     a step only touches the rows that occurred in the batch
+#   - gradients are clipped by their global L2 norm before the update
+#
+# The sentences of one document are run through the word RNN together,
+# padded to the longest sentence, so the Python loop runs once per timestep
+# rather than once per token.
+
+# Parameter names follow the 'model_params' layout load_model() understands
+PARAMETER_NAMES = (
+    ('word_encoder', 'embedding'),
+    ('word_encoder', 'W_ih'),
+    ('word_encoder', 'W_hh'),
+    ('word_encoder', 'b_h'),
+    ('sentence_encoder', 'W_ih_sent'),
+    ('sentence_encoder', 'W_hh_sent'),
+    ('sentence_encoder', 'b_h_sent'),
+    ('classifier', 'W_class'),
+    ('classifier', 'b_class'),
+)
+EMBEDDING = 'word_encoder.embedding'
+
+
+def get_parameters(model):
+    """Return {'component.attr': array} referencing the model's live arrays"""
+    return {f"{part}.{attr}": getattr(getattr(model, part), attr) for part, attr in PARAMETER_NAMES}
+
+
+def set_parameter(model, name, value):
+    part, attr = name.split('.', 1)
+    setattr(getattr(model, part), attr, value)
+
+
+def model_state(model):
+    """Return the {'config', 'model_params'} layout that load_model() restores"""
+    model_params = {}
+    for part, attr in PARAMETER_NAMES:
+        model_params.setdefault(part, {})[attr] = getattr(getattr(model, part), attr).copy()
+    config = {
+        'vocab_size': model.vocab_size,
+        'embed_dim': model.embed_dim,
+        'hidden_dim': model.hidden_dim,
+    }
+    return {'config': config, 'model_params': model_params}
+
+
+def save_model(path, model, preprocessor, optimizer=None):
+    """Pickle a model for load_model(), with optimizer state if given"""
+    data = model_state(model)
+    data['preprocessor'] = preprocessor
+    if optimizer is not None:
+        data['optimizer'] = optimizer.state_dict()
+    with open(path, 'wb') as f:
+        pickle.dump(data, f)
+
+
+class GradientBuffers:
+    """Dense gradient buffers plus a sparse row buffer for the embedding"""
+
+    def __init__(self, model):
+        self.dense = {name: np.zeros_like(param)
+                      for name, param in get_parameters(model).items() if name != EMBEDDING}
+        self.embedding_name = EMBEDDING
+        self.embed_dim = model.word_encoder.embed_dim
+        self.dtype = model.word_encoder.embedding.dtype
+        self.zero()
+
+    def zero(self):
+        for grad in self.dense.values():
+            grad.fill(0)
+        self._rows = []
+        self._row_grads = []
+        self.num_sentences = 0
+        self.num_documents = 0
+        self.loss = 0.0
+
+    def add_embedding(self, rows, grads):
+        self._rows.append(np.asarray(rows, dtype=np.int64))
+        self._row_grads.append(np.asarray(grads, dtype=self.dtype))
+
+    def embedding_gradient(self):
+        """Return (unique rows, summed row gradients) for the embedding table"""
+        if not self._rows:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.embed_dim), dtype=self.dtype)
+        rows = np.concatenate(self._rows)
+        grads = np.concatenate(self._row_grads)
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        summed = np.zeros((len(unique_rows), self.embed_dim), dtype=self.dtype)
+        np.add.at(summed, inverse, grads)
+        # Keep the reduced form so repeated calls are cheap
+        self._rows = [unique_rows]
+        self._row_grads = [summed]
+        return unique_rows, summed
+
+    def scale(self, factor):
+        for grad in self.dense.values():
+            grad *= factor
+        for grads in self._row_grads:
+            grads *= factor
+
+    def global_norm(self):
+        total = sum(float(np.sum(grad * grad)) for grad in self.dense.values())
+        _, row_grads = self.embedding_gradient()
+        total += float(np.sum(row_grads * row_grads))
+        return np.sqrt(total)
+
+    def clip_by_global_norm(self, max_norm):
+        norm = self.global_norm()
+        if max_norm and norm > max_norm:
+            self.scale(max_norm / (norm + 1e-6))
+        return norm
+
+
+def _pad_sentences(encoder, sentences):
+    n = len(sentences)
+    lengths = np.array([len(s) for s in sentences], dtype=np.int64)
+    T = int(lengths.max()) if n else 0
+    rows = np.zeros((n, T), dtype=np.int64)
+    for i, sentence in enumerate(sentences):
+        if lengths[i]:
+            rows[i, :lengths[i]] = np.clip(np.asarray(sentence, dtype=np.int64), 0, encoder.vocab_size - 1)
+    valid = np.arange(T)[None, :] < lengths[:, None]
+    return rows, valid, lengths
+
+
+def _embed_segment(encoder, rows, t0, dropout_seed):
+    """Embeddings for a segment of timesteps; dropout is reproducible per segment"""
+    X = encoder.embedding[rows]
+    mask = None
+    if dropout_seed is not None:
+        rng = np.random.RandomState((dropout_seed + t0) % (2 ** 32))
+        mask = (rng.binomial(1, 1 - encoder.dropout, X.shape) / (1 - encoder.dropout)).astype(X.dtype)
+        X *= mask
+    return X, mask
+
+
+def _run_segment(encoder, X, valid, h0):
+    n, L = valid.shape
+    # Input projection for every timestep in one matmul
+    U = X @ encoder.W_ih.T + encoder.b_h
+    H = np.zeros((n, L + 1, encoder.hidden_dim), dtype=encoder.W_hh.dtype)
+    H[:, 0] = h0
+    for t in range(L):
+        h = np.tanh(U[:, t] + H[:, t] @ encoder.W_hh.T)
+        H[:, t + 1] = np.where(valid[:, t, None], h, H[:, t])
+    return H
+
+
+def _backward_segment(encoder, grad_h, X, mask, H, rows, valid, window, buffers):
+    n, L = valid.shape
+    G = np.zeros((n, L, encoder.hidden_dim), dtype=H.dtype)
+    for t in reversed(range(L)):
+        w = window[:, t, None]
+        grad_pre = np.where(w, grad_h * (1 - H[:, t + 1] ** 2), 0)
+        G[:, t] = grad_pre
+        # Padding steps pass the gradient straight through; truncated steps stop it
+        grad_h = np.where(w, grad_pre @ encoder.W_hh, np.where(valid[:, t, None], 0, grad_h))
+
+    dense = buffers.dense
+    dense['word_encoder.W_ih'] += np.einsum('nth,ntd->hd', G, X)
+    dense['word_encoder.W_hh'] += np.einsum('nth,ntk->hk', G, H[:, :L])
+    dense['word_encoder.b_h'] += G.sum(axis=(0, 1))
+
+    grad_X = G @ encoder.W_ih
+    if mask is not None:
+        grad_X *= mask
+    buffers.add_embedding(rows[window], grad_X[window])
+    return grad_h
+
+
+def word_rnn_forward(encoder, sentences, training=True, checkpoint_every=None):
+    """Run the word RNN over all sentences of a document at once.
+
+    Returns the final hidden state per sentence and a cache for
+    word_rnn_backward. Shorter sentences carry their last state forward
+    through the padding, so the last state is each sentence's representation.
+
+    With checkpoint_every=k only the hidden states at every k-th timestep
+    are kept; word_rnn_backward recomputes each segment from its checkpoint.
+    Activation memory drops from O(T) to O(T/k + k) per sentence, so
+    k ~ sqrt(T) makes full-length BPTT affordable on long inputs. Dropout
+    masks are seeded per segment so recomputation reproduces them exactly.
+    """
+    rows, valid, lengths = _pad_sentences(encoder, sentences)
+    n, T = rows.shape
+    dropout_seed = None
+    if training and encoder.dropout > 0:
+        dropout_seed = np.random.randint(2 ** 31 - 1)
+
+    k = checkpoint_every or max(T, 1)
+    bounds = [(t0, min(t0 + k, T)) for t0 in range(0, T, k)]
+    h = np.zeros((n, encoder.hidden_dim), dtype=encoder.W_hh.dtype)
+    starts = []
+    saved = None
+    for t0, t1 in bounds:
+        starts.append(h)
+        X, mask = _embed_segment(encoder, rows[:, t0:t1], t0, dropout_seed)
+        H = _run_segment(encoder, X, valid[:, t0:t1], h)
+        h = H[:, -1].copy()
+        if checkpoint_every is None:
+            saved = (X, mask, H)
+
+    return h, (rows, valid, lengths, dropout_seed, bounds, starts, saved)
+
+
+def word_rnn_backward(encoder, grad_reps, cache, buffers, bptt_steps=None):
+    """Backpropagate through word_rnn_forward, accumulating into buffers"""
+    rows, valid, lengths, dropout_seed, bounds, starts, saved = cache
+    n, T = rows.shape
+    if T == 0:
+        return
+
+    window = valid
+    if bptt_steps:
+        window = valid & (np.arange(T)[None, :] >= (lengths - bptt_steps)[:, None])
+
+    grad_h = grad_reps.astype(encoder.W_hh.dtype)
+    for (t0, t1), h0 in zip(reversed(bounds), reversed(starts)):
+        if not window[:, t0:t1].any():
+            # Nothing to accumulate; rows with real tokens here are past their truncation window
+            grad_h = np.where(valid[:, t0:t1].any(axis=1)[:, None], 0, grad_h)
+            continue
+        if saved is not None:
+            X, mask, H = saved
+        else:
+            X, mask = _embed_segment(encoder, rows[:, t0:t1], t0, dropout_seed)
+            H = _run_segment(encoder, X, valid[:, t0:t1], h0)
+        grad_h = _backward_segment(encoder, grad_h, X, mask, H, rows[:, t0:t1], valid[:, t0:t1],
+                                   window[:, t0:t1], buffers)
+
+
+def document_forward(model, sentences, training=True, checkpoint_every=None):
+    """Forward pass for one document; returns (probabilities, cache)"""
+    encoder = model.word_encoder
+    sent_enc = model.sentence_encoder
+    reps, word_cache = word_rnn_forward(encoder, sentences, training, checkpoint_every)
+
+    n = len(sentences)
+    S = np.zeros((n + 1, encoder.hidden_dim), dtype=sent_enc.W_hh_sent.dtype)
+    proj = reps @ sent_enc.W_ih_sent.T + sent_enc.b_h_sent
+    for t in range(n):
+        S[t + 1] = np.tanh(proj[t] + sent_enc.W_hh_sent @ S[t])
+
+    logits = S[1:] @ model.classifier.W_class[0] + model.classifier.b_class[0]
+    clipped = np.clip(logits, -10, 10)
+    probabilities = 1.0 / (1.0 + np.exp(-clipped))
+    return probabilities, (reps, word_cache, S, logits)
+
+
+def document_backward(model, labels, probabilities, cache, buffers, bptt_steps=None):
+    """Accumulate gradients of the summed binary cross-entropy for one document"""
+    reps, word_cache, S, logits = cache
+    sent_enc = model.sentence_encoder
+    dense = buffers.dense
+    labels = np.asarray(labels, dtype=np.float32)
+    n = len(labels)
+
+    # d(BCE)/d(logit) through the sigmoid; zero where the logit was clipped
+    states = S[1:]
+    grad_logits = ((probabilities - labels) * (np.abs(logits) < 10)).astype(states.dtype)
+    dense['classifier.W_class'] += grad_logits @ states
+    dense['classifier.b_class'] += grad_logits.sum()
+    grad_states = np.outer(grad_logits, model.classifier.W_class[0])
+
+    grad_pre = np.zeros_like(states)
+    grad_h = np.zeros(states.shape[1], dtype=states.dtype)
+    for t in reversed(range(n)):
+        grad_pre[t] = (grad_states[t] + grad_h) * (1 - states[t] ** 2)
+        grad_h = sent_enc.W_hh_sent.T @ grad_pre[t]
+
+    dense['sentence_encoder.W_ih_sent'] += grad_pre.T @ reps
+    dense['sentence_encoder.W_hh_sent'] += grad_pre.T @ S[:n]
+    dense['sentence_encoder.b_h_sent'] += grad_pre.sum(axis=0)
+
+    grad_reps = grad_pre @ sent_enc.W_ih_sent
+    word_rnn_backward(model.word_encoder, grad_reps, word_cache, buffers, bptt_steps)
+
+
+def binary_cross_entropy(probabilities, labels):
+    p = np.clip(probabilities, 1e-7, 1 - 1e-7)
+    labels = np.asarray(labels, dtype=np.float64)
+    return float(-np.sum(labels * np.log(p) + (1 - labels) * np.log(1 - p)))
+
+
+def accumulate_document(model, sentences, labels, buffers, bptt_steps=None, checkpoint_every=None):
+    """Forward and backward one document into buffers; returns its summed loss"""
+    if len(sentences) == 0:
+        return 0.0
+    probabilities, cache = document_forward(model, sentences, training=True, checkpoint_every=checkpoint_every)
+    document_backward(model, labels, probabilities, cache, buffers, bptt_steps)
+    loss = binary_cross_entropy(probabilities, labels)
+    buffers.loss += loss
+    buffers.num_sentences += len(sentences)
+    buffers.num_documents += 1
+    return loss
+
+
+def iter_batches(documents, batch_size):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class TrainingEngine:
+    """Accumulates gradients over mini-batches and steps once per batch.
+
+    documents are (sentences, labels) pairs, where sentences is a list of
+    token index sequences -- for example a dataset_shards.ShardedDataset.
+    optimizer is any optimizers.Optimizer; plain SGD at learning_rate by default.
+    checkpoint_every enables gradient checkpointing in the word RNN (see
+    word_rnn_forward); bptt_steps=None backpropagates through whole sentences.
+    """
+
+    def __init__(self, model, learning_rate=0.01, batch_size=32, max_grad_norm=5.0, bptt_steps=None,
+                 optimizer=None, checkpoint_every=None):
+        self.model = model
+        self.optimizer = optimizer or SGD(learning_rate)
+        self.batch_size = batch_size
+        self.max_grad_norm = max_grad_norm
+        self.bptt_steps = bptt_steps
+        self.checkpoint_every = checkpoint_every
+        self.buffers = GradientBuffers(model)
+        self.step_count = 0
+
+    def compute_gradients(self, batch):
+        """Fill self.buffers with the mean gradient of a batch; returns the mean loss"""
+        buffers = self.buffers
+        buffers.zero()
+        for sentences, labels in batch:
+            accumulate_document(self.model, sentences, labels, buffers, self.bptt_steps, self.checkpoint_every)
+        if buffers.num_sentences == 0:
+            return 0.0
+        buffers.scale(1.0 / buffers.num_sentences)
+        return buffers.loss / buffers.num_sentences
+
+    def apply_gradients(self):
+        norm = self.buffers.clip_by_global_norm(self.max_grad_norm)
+        self.optimizer.step(get_parameters(self.model), self.buffers)
+        self.step_count += 1
+        return norm
+
+    def train_batch(self, batch):
+        loss = self.compute_gradients(batch)
+        if self.buffers.num_sentences:
+            self.apply_gradients()
+        return loss
+
+    def train_epoch(self, documents, log_every=100, on_batch=None):
+        """Train on an iterable of documents; on_batch(num_docs) runs after every step"""
+        start = time.time()
+        total_loss = 0.0
+        num_docs = 0
+        for batch_no, batch in enumerate(iter_batches(documents, self.batch_size), start=1):
+            loss = self.train_batch(batch)
+            total_loss += loss * len(batch)
+            num_docs += len(batch)
+            if on_batch is not None:
+                on_batch(num_docs)
+            if log_every and batch_no % log_every == 0:
+                elapsed = time.time() - start
+                print(f"Batch {batch_no}: loss {loss:.4f}, {num_docs / max(elapsed, 1e-9):.1f} docs/s")
+        elapsed = time.time() - start
+        mean_loss = total_loss / max(num_docs, 1)
+        print(f"Epoch done: {num_docs} documents, mean loss {mean_loss:.4f}, {elapsed:.1f}s")
+        return mean_loss
+
+
+if __name__ == "__main__":
+    import argparse
+    from model_classes import ImprovedExtractiveRNNSummarizer
+    from dataset_shards import ShardedDataset, load_preprocessor
+    from optimizers import OPTIMIZERS, make_optimizer
+    from checkpoints import CheckpointWriter, capture_state, restore_state, load_checkpoint, latest_checkpoint
+
+    parser = argparse.ArgumentParser(description="Train the extractive summarizer on pre-tokenized shards")
+    parser.add_argument("data_dir", nargs="?", help="output of dataset_shards.py")
+    parser.add_argument("--preprocessor")
+    parser.add_argument("--output", default="improved_rnn_model.pkl")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--optimizer", choices=sorted(OPTIMIZERS), default="adam")
+    parser.add_argument("--learning-rate", type=float, default=0.001)
+    parser.add_argument("--max-grad-norm", type=float, default=5.0)
+    parser.add_argument("--bptt-steps", type=int, default=None)
+    parser.add_argument("--checkpoint-every", type=int, default=None,
+                        help="keep word RNN states every k steps and recompute the rest in backward")
+    parser.add_argument("--embed-dim", type=int, default=64)
+    parser.add_argument("--hidden-dim", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-dir", help="directory for periodic resumable checkpoints")
+    parser.add_argument("--save-every", type=int, default=100, help="optimizer steps between checkpoints")
+    parser.add_argument("--keep", type=int, default=3, help="number of checkpoints to keep")
+    parser.add_argument("--resume", help="checkpoint file, or a --save-dir to resume from its latest")
+    args = parser.parse_args()
+
+    state = None
+    if args.resume:
+        path = latest_checkpoint(args.resume) if os.path.isdir(args.resume) else args.resume
+        if not path:
+            parser.error(f"No checkpoint found in {args.resume}")
+        print(f"Resuming from {path}")
+        state = load_checkpoint(path)
+        # Every option that affects the trajectory comes from the checkpoint
+        for key, value in state['args'].items():
+            if key not in ('resume', 'output', 'save_dir', 'keep') and not (key == 'data_dir' and args.data_dir):
+                setattr(args, key, value)
+        preprocessor = state['preprocessor']
+    elif args.data_dir and args.preprocessor:
+        preprocessor = load_preprocessor(args.preprocessor)
+    else:
+        parser.error("data_dir and --preprocessor are required unless resuming")
+
+    np.random.seed(args.seed)
+    model = ImprovedExtractiveRNNSummarizer(len(preprocessor.word_to_idx), args.embed_dim, args.hidden_dim)
+    optimizer = make_optimizer(args.optimizer, learning_rate=args.learning_rate)
+    engine = TrainingEngine(model, batch_size=args.batch_size, max_grad_norm=args.max_grad_norm,
+                            bptt_steps=args.bptt_steps, optimizer=optimizer,
+                            checkpoint_every=args.checkpoint_every)
+    dataset = ShardedDataset(args.data_dir, seed=args.seed, cache=True)
+
+    first_epoch, first_document = 0, 0
+    if state is not None:
+        first_epoch, first_document = restore_state(engine, state)
+    writer = CheckpointWriter(args.save_dir, args.keep) if args.save_dir else None
+    saved_args = {k: v for k, v in vars(args).items() if k != 'resume'}
+
+    for epoch in range(first_epoch, args.epochs):
+        print(f"Epoch {epoch + 1}/{args.epochs}")
+        start = first_document if epoch == first_epoch else 0
+
+        def on_batch(num_docs, epoch=epoch, start=start):
+            if writer and engine.step_count % args.save_every == 0:
+                writer.save(capture_state(engine, preprocessor, epoch, start + num_docs, saved_args))
+
+        engine.train_epoch(dataset.iter_epoch(epoch, start), on_batch=on_batch)
+
+    if writer:
+        writer.save(capture_state(engine, preprocessor, args.epochs, 0, saved_args))
+        writer.close()
+    save_model(args.output, model, preprocessor, optimizer)
+    print(f"Saved model to {args.output}")
@@ -0,0 +1,218 @@
+import os
+import re
+import codecs
+from html.parser import HTMLParser
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+from segmenter import StreamingSegmenter
+
+# Streaming document uploads for /summarize/upload.
+#
+# The request body is read in fixed-size blocks. Multipart bodies go through
+# werkzeug's incremental MultipartDecoder instead of request.files, so the
+# file is never spooled whole. Each block is decoded and converted to plain
+# text by an extractor for the file type, and the text goes straight into a
+# StreamingSegmenter. Only the first max_document_sentences sentences are kept
+# (split_into_sentences' limit); the rest of the body is still read so word
+# counts, and with them the summary length, cover the whole document.
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UnsupportedUpload(ValueError):
+    pass
+
+
+class PlainTextExtractor:
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def feed(self, data):
+        return self._decoder.decode(data)
+
+    def close(self):
+        return self._decoder.decode(b'', final=True)
+
+
+class MarkdownExtractor(PlainTextExtractor):
+    """Strips markup line by line; fenced code blocks are dropped"""
+    _LINK_RE = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+    _PREFIX_RE = re.compile(r'^\s{0,3}(#{1,6}\s+|>\s?|[-*+]\s+|\d+[.)]\s+)')
+    _EMPHASIS_RE = re.compile(r'(\*{1,3}|_{1,3}|`+|~~)')
+
+    def __init__(self):
+        super().__init__()
+        self._partial = ''
+        self._in_code = False
+
+    def _clean(self, line):
+        if line.lstrip().startswith(('```', '~~~')):
+            self._in_code = not self._in_code
+            return '\n'
+        if self._in_code:
+            return ''
+        line = self._LINK_RE.sub(r'\1', line)
+        line = self._PREFIX_RE.sub('', line)
+        return self._EMPHASIS_RE.sub('', line) + '\n'
+
+    def feed(self, data):
+        lines = (self._partial + super().feed(data)).split('\n')
+        self._partial = lines.pop()
+        return ''.join(self._clean(line) for line in lines)
+
+    def close(self):
+        rest = self._partial + super().close()
+        self._partial = ''
+        return self._clean(rest) if rest else ''
+
+
+class _TextCollector(HTMLParser):
+    SKIP = {'script', 'style', 'head', 'noscript', 'template'}
+    BLOCK = {'p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'section', 'article',
+             'blockquote', 'pre', 'td', 'th', 'title'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.pieces = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+        elif tag in self.BLOCK:
+            self.pieces.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK:
+            self.pieces.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.pieces.append(data)
+
+
+class HTMLExtractor(PlainTextExtractor):
+    def __init__(self):
+        super().__init__()
+        self._parser = _TextCollector()
+
+    def _drain(self):
+        text = ''.join(self._parser.pieces)
+        self._parser.pieces = []
+        return text
+
+    def feed(self, data):
+        self._parser.feed(super().feed(data))
+        return self._drain()
+
+    def close(self):
+        self._parser.feed(super().close())
+        self._parser.close()
+        return self._drain()
+
+
+EXTRACTORS = {
+    '.txt': PlainTextExtractor,
+    '.md': MarkdownExtractor,
+    '.markdown': MarkdownExtractor,
+    '.html': HTMLExtractor,
+    '.htm': HTMLExtractor,
+}
+
+
+def make_extractor(filename):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in EXTRACTORS:
+        raise UnsupportedUpload(f"Unsupported file type '{extension}'; allowed: {', '.join(sorted(EXTRACTORS))}")
+    return EXTRACTORS[extension]()
+
+
+def iter_blocks(stream, chunk_size=CHUNK_SIZE):
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            return
+        yield block
+
+
+def iter_multipart_file(stream, boundary, max_size=None, chunk_size=CHUNK_SIZE):
+    """Yield (filename, data) for the first file part of a multipart/form-data body"""
+    decoder = MultipartDecoder(boundary.encode('latin-1'), max_form_memory_size=max_size)
+    filename = None
+    in_file = False
+    for block in iter_blocks(stream, chunk_size):
+        decoder.receive_data(block)
+        event = decoder.next_event()
+        while not isinstance(event, (NeedData, Epilogue)):
+            if isinstance(event, File) and filename is None:
+                filename = event.filename
+                in_file = True
+            elif isinstance(event, (Field, File)):
+                in_file = False  # form fields and any further files are skipped
+            elif isinstance(event, Data) and in_file:
+                if event.data:
+                    yield filename, event.data
+                if not event.more_data:
+                    in_file = False
+            event = decoder.next_event()
+        if isinstance(event, Epilogue):
+            break
+    decoder.receive_data(None)
+    if filename is None:
+        raise UnsupportedUpload("No file part in multipart upload")
+
+
+def _count_words(text, in_word):
+    """Words in text, not counting one continued from the previous piece; returns (count, ends_in_word)"""
+    if not text:
+        return 0, in_word
+    count = len(text.split())
+    if in_word and not text[0].isspace():
+        count -= 1
+    return count, not text[-1].isspace()
+
+
+class UploadSummarizer:
+    """Consumes a file's bytes block by block and keeps what summarization needs"""
+
+    def __init__(self, filename, max_document_sentences=10):
+        self.filename = filename
+        self.max_document_sentences = max_document_sentences
+        self._extractor = make_extractor(filename)
+        self._segmenter = StreamingSegmenter()
+        self._in_word = False
+        self.sentences = []
+        self.total_sentences = 0
+        self.word_count = 0
+        self.bytes_read = 0
+        self.characters = 0
+
+    def _add_text(self, text):
+        self.characters += len(text)
+        count, self._in_word = _count_words(text, self._in_word)
+        self.word_count += count
+        return self._segmenter.feed(text)
+
+    def _add_sentences(self, found):
+        self.total_sentences += len(found)
+        room = self.max_document_sentences - len(self.sentences)
+        self.sentences.extend(sentence for _, _, sentence in found[:max(room, 0)])
+
+    def feed(self, data):
+        self.bytes_read += len(data)
+        self._add_sentences(self._add_text(self._extractor.feed(data)))
+
+    def close(self):
+        found = self._add_text(self._extractor.close())
+        self._add_sentences(found + self._segmenter.close())
+
+    def stats(self):
+        return {
+            'filename': self.filename,
+            'bytes': self.bytes_read,
+            'characters': self.characters,
+            'words': self.word_count,
+            'sentences': self.total_sentences,
+        }
@@ -0,0 +1,182 @@
+import os
+import heapq
+from collections import Counter
+from multiprocessing import Pool
+
+from model_classes import TextPreprocessor
+
+# Streaming vocabulary builder for corpora that do not fit in memory.
+#
+# Texts are read lazily (from files line by line, or from any iterable),
+# grouped into chunks of roughly `chunk_chars` characters, and counted in a
+# pool of worker processes. Partial counts are merged in corpus order, so in
+# exact mode the resulting vocabulary (including the order of ties) is
+# identical to TextPreprocessor.build_vocabulary on the same texts.
+#
+# In approximate mode the merged counts are kept in a Space-Saving summary of
+# fixed capacity. Every reported count overestimates the true count by at most
+# total_tokens / capacity, and every word with a true count above that bound
+# is guaranteed to be in the summary.
+
+_tokenizer = TextPreprocessor()
+
+
+def _count_chunk(texts):
+    counts = Counter()
+    for text in texts:
+        counts.update(_tokenizer.tokenize(text))
+    return counts
+
+
+def iter_file_texts(paths, encoding='utf-8'):
+    """Yield the lines of each file; tokens never span a line break"""
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    for path in paths:
+        with open(path, 'r', encoding=encoding, errors='replace') as f:
+            for line in f:
+                yield line
+
+
+def iter_chunks(texts, chunk_chars=1 << 20):
+    """Group an iterable of texts into lists of about chunk_chars characters"""
+    chunk = []
+    size = 0
+    for text in texts:
+        chunk.append(text)
+        size += len(text)
+        if size >= chunk_chars:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+
+
+class SpaceSavingCounter:
+    """Bounded-memory heavy-hitters summary (Metwally et al., Space-Saving)"""
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        self._heap = []
+
+    def update(self, counts):
+        for word, weight in counts.items():
+            self.add(word, weight)
+
+    def add(self, word, weight=1):
+        self.total += weight
+        if word in self.counts:
+            self.counts[word] += weight
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[word] = weight
+            self.errors[word] = 0
+            heapq.heappush(self._heap, (weight, word))
+            return
+
+        # Evict the current minimum; heap entries are refreshed lazily
+        while True:
+            count, victim = heapq.heappop(self._heap)
+            if self.counts[victim] == count:
+                break
+            heapq.heappush(self._heap, (self.counts[victim], victim))
+        del self.counts[victim]
+        del self.errors[victim]
+        self.counts[word] = count + weight
+        self.errors[word] = count
+        heapq.heappush(self._heap, (count + weight, word))
+
+    @property
+    def error_bound(self):
+        """Maximum overestimate of any reported count"""
+        return self.total // self.capacity
+
+    def guaranteed(self, word):
+        """Lower bound on the true count of word"""
+        return self.counts.get(word, 0) - self.errors.get(word, 0)
+
+    def most_common(self, n=None):
+        items = sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)
+        return items if n is None else items[:n]
+
+    def to_counter(self):
+        return Counter(dict(self.most_common()))
+
+
+def count_words(texts, workers=None, chunk_chars=1 << 20, approximate=False, capacity=None):
+    """Count tokens of a text stream in parallel.
+
+    Returns a Counter in exact mode, or a SpaceSavingCounter when
+    approximate=True (capacity defaults to 100000 entries).
+    """
+    if approximate:
+        merged = SpaceSavingCounter(capacity or 100000)
+    else:
+        merged = Counter()
+
+    chunks = iter_chunks(texts, chunk_chars)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        for chunk in chunks:
+            merged.update(_count_chunk(chunk))
+        return merged
+
+    with Pool(workers) as pool:
+        # imap keeps chunk order, which keeps tie order identical to the serial builder
+        for partial in pool.imap(_count_chunk, chunks):
+            merged.update(partial)
+    return merged
+
+
+def build_vocabulary_streaming(source, vocab_size=5000, workers=None, chunk_chars=1 << 20,
+                               approximate=False, capacity=None):
+    """Build a TextPreprocessor from file paths or an iterable of texts"""
+    if isinstance(source, (str, os.PathLike)) or (
+            isinstance(source, (list, tuple)) and source and all(
+                isinstance(p, (str, os.PathLike)) and os.path.isfile(p) for p in source)):
+        texts = iter_file_texts(source)
+    else:
+        texts = source
+
+    print("Building vocabulary (streaming)...")
+    if approximate and capacity is None:
+        capacity = max(20 * vocab_size, 10000)
+    counts = count_words(texts, workers, chunk_chars, approximate, capacity)
+
+    preprocessor = TextPreprocessor(vocab_size)
+    if approximate:
+        print(f"Approximate counts: {counts.total} tokens, error bound +{counts.error_bound}")
+        preprocessor.build_vocabulary_from_counts(counts.to_counter())
+    else:
+        preprocessor.build_vocabulary_from_counts(counts)
+    return preprocessor
+
+
+if __name__ == "__main__":
+    import argparse
+    import pickle
+
+    parser = argparse.ArgumentParser(description="Build a vocabulary from large text files")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--output", default="preprocessor.pkl")
+    parser.add_argument("--vocab-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-chars", type=int, default=1 << 20)
+    parser.add_argument("--approximate", action="store_true")
+    parser.add_argument("--capacity", type=int, default=None)
+    args = parser.parse_args()
+
+    preprocessor = build_vocabulary_streaming(
+        args.files, args.vocab_size, args.workers, args.chunk_chars,
+        args.approximate, args.capacity
+    )
+    with open(args.output, "wb") as f:
+        pickle.dump(preprocessor, f)
+    print(f"Saved preprocessor to {args.output}")
@@ -0,0 +1,145 @@
+import os
+import time
+import queue
+import threading
+import traceback
+
+# Background batching for non-critical inserts (analytics, history).
+#
+# On SQLite every commit takes the single write lock and syncs the WAL, so
+# many tiny writes from request threads contend with the writes that matter
+# (signups, activities). Rows handed to WriteBatcher.add() are queued in
+# memory and a background thread inserts them in batches: one transaction
+# and one executemany per table every flush_interval seconds, or sooner once
+# max_batch rows are waiting. Within a batch, tables are written parents
+# first (in foreign-key dependency order), so a child row queued before or
+# alongside its parent never reaches the database ahead of it.
+#
+# add(..., ignore_duplicates=True) skips rows whose key already exists, for
+# content-addressed tables where another request may have stored the row.
+#
+# The trade-off is that queued rows are not yet visible to readers, and are
+# lost if the process dies before the next flush. When the queue is full,
+# add() drops the row and returns False rather than slowing the request.
+
+
+def _insert(table, ignore_duplicates, dialect_name):
+    if not ignore_duplicates:
+        return table.insert()
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    # MySQL / MariaDB
+    return table.insert().prefix_with('IGNORE')
+
+
+def _dependency_rank(table):
+    """Position of table in its metadata's foreign-key order (parents first)"""
+    try:
+        return table.metadata.sorted_tables.index(table)
+    except ValueError:
+        return 0
+
+
+class WriteBatcher:
+    def __init__(self, app, db, flush_interval=0.5, max_batch=500, max_queue=10000, retries=2):
+        self.app = app
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.retries = retries
+        self._queue = queue.Queue(max_queue)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._lock = threading.Lock()
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+
+    @classmethod
+    def from_env(cls, app, db):
+        return cls(app, db,
+                   flush_interval=float(os.getenv('WRITE_BATCH_INTERVAL', 0.5)),
+                   max_batch=int(os.getenv('WRITE_BATCH_MAX', 500)),
+                   max_queue=int(os.getenv('WRITE_BATCH_QUEUE', 10000)))
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def add(self, table, ignore_duplicates=False, **values):
+        """Queue a row for table (a Table or a model class); False if it was dropped"""
+        table = getattr(table, '__table__', table)
+        try:
+            self._queue.put_nowait((table, values, ignore_duplicates))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        if self._queue.qsize() >= self.max_batch:
+            self._wake.set()
+        return True
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        """Stop the thread after writing whatever is still queued"""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _take_batch(self):
+        batch = []
+        try:
+            while len(batch) < self.max_batch:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch):
+        # executemany needs the same columns in every row of a statement
+        groups = {}
+        for table, values, ignore_duplicates in batch:
+            groups.setdefault((table, tuple(sorted(values)), ignore_duplicates), []).append(values)
+        # Parents before children; sorted() keeps first-appearance order otherwise
+        ordered = sorted(groups.items(), key=lambda item: _dependency_rank(item[0][0]))
+        for attempt in range(self.retries + 1):
+            try:
+                with self.db.engine.begin() as conn:
+                    for (table, _, ignore_duplicates), rows in ordered:
+                        conn.execute(_insert(table, ignore_duplicates, conn.dialect.name), rows)
+                self._count('written', len(batch))
+                self._count('batches')
+                return
+            except Exception:
+                if attempt == self.retries:
+                    self._count('failed', len(batch))
+                    print(f"Write batch of {len(batch)} rows failed:", traceback.format_exc())
+                else:
+                    time.sleep(0.1 * (attempt + 1))
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        with self.app.app_context():
+            batch = self._take_batch()
+            while batch:
+                self._write(batch)
+                batch = self._take_batch()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['pending'] = self._queue.qsize()
+        return stats